@@ -6,38 +6,45 @@ import os
 import re
 import time
 import json
-import glob
-import tempfile
-import requests
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+import hmac
+import hashlib
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, stream_with_context
 from pathlib import Path
-import zipfile
 from datetime import datetime
 
+from kie_client import KieClient, VEO_MODEL, DEFAULT_ASPECT_RATIO
+from job_store import JobStore, TERMINAL_STATUSES, POOL_UNAVAILABLE_ERROR, batch_owner
+from video_cache import VideoCache
+from zip_stream import iter_zip, COPY_CHUNK_SIZE
+from poller import BackgroundPoller, FIRST_POLL_AFTER, next_poll_delay
+from rate_limiter import RateLimiter
+from retry_policy import classify_error, is_key_error, backoff_delay, PERMANENT, TRANSIENT
+from key_pool import KeyPool
+from status_cache import StatusCache
+from transcript_cache import TranscriptCache, canonical_video_key
+from transcript_extractor import extract_transcript_from_url, STRATEGIES
+from audio_pipeline import Transcriber, WHISPER_URL
+from script_parser import parse_script
+from chunker import (chunk_transcript_locally, chunk_label, format_chunk, parse_chunk_response, repair_chunks,
+                     ChunkStreamParser)
+
 try:
     import anthropic
     HAS_ANTHROPIC = True
 except ImportError:
     HAS_ANTHROPIC = False
 
-try:
-    import yt_dlp
-    HAS_YTDLP = True
-except ImportError:
-    HAS_YTDLP = False
-
-try:
-    import openai
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
-
 app = Flask(__name__, static_folder='static', static_url_path='/static')
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
-Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['OUTPUT_FOLDER']).mkdir(exist_ok=True)
 
+# Batches and jobs live in SQLite; legacy batch_<id>.json files are imported once
+store = JobStore(os.environ.get('JOB_DB_PATH', str(Path(app.config['OUTPUT_FOLDER']) / 'jobs.db')))
+store.import_json_batches(app.config['OUTPUT_FOLDER'])
+
 def clean_api_key(key):
     """Strip invisible Unicode chars that sneak in when pasting into env var UIs"""
     if not key:
@@ -45,8 +52,129 @@ def clean_api_key(key):
     # Keep only printable ASCII (API keys are always ASCII)
     return ''.join(c for c in key.strip() if 32 <= ord(c) < 127)
 
-# Kie AI API endpoint
-KIE_API_BASE = "https://api.kie.ai/api/v1"
+# Kie AI API endpoints
+KIE_API_BASE = os.environ.get('KIE_API_BASE', "https://api.kie.ai/api/v1")
+KIE_UPLOAD_BASE = os.environ.get('KIE_UPLOAD_BASE', "https://kieai.redpandaai.co")
+
+# Per-API-key request budgets shared by all workers, so bursts queue here instead of
+# coming back from Kie as 429s. Budgets are "<requests per second>,<burst>"; rate 0 disables.
+def _budget(name, default):
+    rate, burst = os.environ.get(name, default).split(',')
+    return float(rate), int(burst)
+
+rate_limiter = RateLimiter(
+    os.environ.get('RATE_LIMIT_DB_PATH', str(Path(app.config['OUTPUT_FOLDER']) / 'rate_limits.db')),
+    budgets={
+        'submit': _budget('KIE_SUBMIT_BUDGET', '2,20'),
+        'status': _budget('KIE_STATUS_BUDGET', '10,20'),
+        'upload': _budget('KIE_UPLOAD_BUDGET', '2,10'),
+    },
+    max_wait=float(os.environ.get('KIE_RATE_LIMIT_MAX_WAIT', '60')),
+)
+
+# Shared pooled client for every call to Kie AI (API, uploads, video CDN)
+kie = KieClient(
+    api_base=KIE_API_BASE,
+    upload_base=KIE_UPLOAD_BASE,
+    pool_size=int(os.environ.get('KIE_POOL_SIZE', '32')),
+    connect_timeout=float(os.environ.get('KIE_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.environ.get('KIE_READ_TIMEOUT', '30')),
+    limiter=rate_limiter,
+)
+
+# Transcripts by canonical video, so re-extracting the same video costs no yt-dlp run or Whisper call
+transcript_cache = TranscriptCache(
+    os.environ.get('TRANSCRIPT_CACHE_PATH', str(Path(app.config['OUTPUT_FOLDER']) / 'transcripts.db')),
+    ttl=float(os.environ.get('TRANSCRIPT_CACHE_TTL_DAYS', '30')) * 86400,
+    max_bytes=int(os.environ.get('TRANSCRIPT_CACHE_MAX_MB', '50')) * 1024 * 1024,
+)
+
+# Tabs, the poller and callbacks asking about the same task share one upstream lookup
+status_cache = StatusCache(
+    kie.check_status,
+    ttl=float(os.environ.get('STATUS_CACHE_TTL', '3')),
+    max_entries=int(os.environ.get('STATUS_CACHE_MAX_ENTRIES', '10000')),
+)
+
+# Optional server-side Kie accounts; batches submitted without an API key draw from these
+key_pool = KeyPool(
+    store,
+    [key.strip() for key in os.environ.get('KIE_API_KEYS', '').split(',') if key.strip()],
+    cooldown=float(os.environ.get('KIE_KEY_COOLDOWN_SECONDS', '60')),
+    disable_for=float(os.environ.get('KIE_KEY_DISABLE_SECONDS', '3600')),
+)
+
+# Finished videos are cached on disk so repeat downloads cost no upstream bandwidth
+video_cache = VideoCache(
+    os.environ.get('VIDEO_CACHE_DIR', str(Path(app.config['OUTPUT_FOLDER']) / 'video_cache')),
+    open_video=kie.open_video,
+    max_bytes=int(os.environ.get('VIDEO_CACHE_MAX_MB', '5000')) * 1024 * 1024,
+    fetch_concurrency=int(os.environ.get('VIDEO_FETCH_CONCURRENCY', '4')),
+)
+
+# Uploaded avatars are reused by content hash while Kie keeps the file (3 days);
+# the TTL leaves headroom for jobs and retries that still reference the URL
+AVATAR_URL_TTL = float(os.environ.get('AVATAR_URL_TTL_HOURS', '48')) * 3600
+MAX_AVATAR_BYTES = 30 * 1024 * 1024
+
+# How long a finished video can stand in for an identical segment in a later run (opt-in per batch)
+MEMO_TTL = float(os.environ.get('MEMO_TTL_DAYS', '14')) * 86400
+
+# Max number of segment submissions in flight at once per dispatch round
+SUBMIT_CONCURRENCY = int(os.environ.get('SUBMIT_CONCURRENCY', '8'))
+
+# Kie tasks a single API key may have generating at once; further jobs wait as 'pending'
+MAX_IN_FLIGHT_PER_KEY = int(os.environ.get('MAX_IN_FLIGHT_PER_KEY', '20'))
+
+# Poll Kie from a background thread instead of inside /api/status requests
+BACKGROUND_POLLER = os.environ.get('BACKGROUND_POLLER', '1') != '0'
+
+# Public URL of this app; when set, Kie reports completion to /api/kie-callback
+# and polling drops to a slow fallback sweep
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')
+KIE_CALLBACK_SECRET = os.environ.get('KIE_CALLBACK_SECRET', '')
+
+# Server-Sent Events: how often a stream checks the store, heartbeat interval,
+# and max stream lifetime before the browser reconnects (with Last-Event-ID)
+SSE_CHECK_SECONDS = float(os.environ.get('SSE_CHECK_SECONDS', '1'))
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = 300
+
+# Transcript extractions run in the background on a small per-worker pool; the cap on
+# queued+running jobs is shared by all workers so a flood of URLs is refused, not queued forever
+TRANSCRIPT_WORKERS = int(os.environ.get('TRANSCRIPT_WORKERS', '2'))
+TRANSCRIPT_MAX_ACTIVE = int(os.environ.get('TRANSCRIPT_MAX_ACTIVE', '20'))
+TRANSCRIPT_JOB_TIMEOUT = float(os.environ.get('TRANSCRIPT_JOB_TIMEOUT', '900'))
+# Each worker marks the jobs in its pool as alive this often; a job that misses three
+# heartbeats lost its worker (restart, crash) and is released instead of blocking a slot
+TRANSCRIPT_HEARTBEAT_SECONDS = float(os.environ.get('TRANSCRIPT_HEARTBEAT_SECONDS', '10'))
+TRANSCRIPT_HEARTBEAT_TIMEOUT = 3 * TRANSCRIPT_HEARTBEAT_SECONDS
+# 'hedged' downloads audio alongside uncertain captions; 'subtitles-first' never downloads audio it might not need
+TRANSCRIPT_STRATEGY = os.environ.get('TRANSCRIPT_STRATEGY', 'hedged')
+if TRANSCRIPT_STRATEGY not in STRATEGIES:
+    raise ValueError(f"TRANSCRIPT_STRATEGY must be one of {', '.join(STRATEGIES)}")
+transcript_executor = ThreadPoolExecutor(max_workers=TRANSCRIPT_WORKERS, thread_name_prefix='transcript')
+# Transcript jobs queued or running in this worker's pool, kept alive by the heartbeat thread
+local_transcript_jobs = set()
+local_transcript_jobs_lock = threading.Lock()
+transcript_heartbeat_thread = None
+
+# Whisper fallback: long audio is cut into ~WHISPER_CHUNK_SECONDS pieces (at silences) and
+# transcribed WHISPER_CONCURRENCY at a time; WHISPER_API_URL can point at a compatible server
+transcriber = Transcriber(
+    api_url=os.environ.get('WHISPER_API_URL', WHISPER_URL),
+    chunk_seconds=float(os.environ.get('WHISPER_CHUNK_SECONDS', '600')),
+    concurrency=int(os.environ.get('WHISPER_CONCURRENCY', '4')),
+)
+
+# Transcript chunking: 'ai' (Claude), 'fast' (local, deterministic) or 'auto' (Claude,
+# falling back to the local chunker when it's unavailable, fails or takes longer than CHUNK_AI_TIMEOUT)
+CHUNK_MODES = ('ai', 'fast', 'auto')
+CHUNK_MODE = os.environ.get('CHUNK_MODE', 'auto')
+if CHUNK_MODE not in CHUNK_MODES:
+    raise ValueError(f"CHUNK_MODE must be one of {', '.join(CHUNK_MODES)}")
+CHUNK_AI_TIMEOUT = float(os.environ.get('CHUNK_AI_TIMEOUT', '30'))
+CLAUDE_MODEL = "claude-sonnet-4-5-20250929"
 
 # Error message mappings for user-friendly guidance
 ERROR_MESSAGES = {
@@ -71,170 +199,281 @@ def parse_error_message(error_msg):
     # Return original message if no match
     return error_msg
 
-def parse_script(script_text):
-    """Parse formatted script into segments - matches ANY label"""
-    segments = []
-    # Updated pattern to match any segment label (HOOK, HOOK V2, Backend 1, etc.)
-    # Captures: segment label, optional "— HOLDING PRODUCT" marker, and the prompt text
-    pattern = r'^([A-Z][A-Za-z0-9\s]+?)(\s*—\s*HOLDING PRODUCT)?\s*\n(.*?)(?=\n^[A-Z][A-Za-z0-9\s]+?(?:\s*—\s*HOLDING PRODUCT)?\s*\n|\Z)'
-    matches = re.findall(pattern, script_text, re.DOTALL | re.MULTILINE)
-    
-    for label, holding_product, prompt in matches:
-        segments.append({
-            'label': label.strip(),
-            'prompt': prompt.strip(),
-            'holding_product': bool(holding_product)
-        })
-    
-    return segments
+def callback_token(batch_id):
+    return hmac.new(KIE_CALLBACK_SECRET.encode(), batch_id.encode(), hashlib.sha256).hexdigest()[:32]
 
-def upload_image(api_key, image_path):
-    """Upload image to Kie AI and return URL"""
-    url = "https://kieai.redpandaai.co/api/file-stream-upload"
-    headers = {'Authorization': f'Bearer {api_key}'}
-    
-    try:
-        with open(image_path, 'rb') as f:
-            files = {'file': (os.path.basename(image_path), f, 'image/jpeg')}
-            data = {'uploadPath': 'avatars'}
-            response = requests.post(url, headers=headers, files=files, data=data)
-            response.raise_for_status()
-            result = response.json()
-            
-            if result.get('success') and result.get('code') == 200:
-                return result.get('data', {}).get('downloadUrl')
-            else:
-                print(f"Upload error: {result.get('msg')}")
-                return None
-    except Exception as e:
-        print(f"Upload exception: {e}")
+def callback_url_for(batch_id):
+    """Kie callback URL for jobs in this batch, or None when callbacks are disabled"""
+    if not PUBLIC_BASE_URL:
         return None
-
-def generate_video(api_key, prompt, image_url=None, aspect_ratio="9:16"):
-    """Generate video via Kie AI API"""
-    url = f"{KIE_API_BASE}/veo/generate"
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
+    url = f"{PUBLIC_BASE_URL}/api/kie-callback?batch_id={batch_id}"
+    if KIE_CALLBACK_SECRET:
+        url += f"&token={callback_token(batch_id)}"
+    return url
+
+def memo_key_for(owner, prompt, avatar_url):
+    """Identity of a generation: same owner, prompt (modulo whitespace), avatar image, model and format"""
+    # Prefer the image's content hash so a re-upload of the same avatar still matches
+    avatar = store.avatar_hash(avatar_url) or avatar_url
+    identity = json.dumps([owner, ' '.join(prompt.split()), avatar, VEO_MODEL, DEFAULT_ASPECT_RATIO])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def build_job(seg, avatar_normal_url, avatar_product_url, owner):
+    """Turn a script segment into a job record waiting in the admission queue"""
+    # Determine which avatar to use
+    if seg['holding_product']:
+        if avatar_product_url:
+            avatar_url = avatar_product_url
+            label_suffix = " (With Product)"
+        else:
+            # No product avatar uploaded - skip with error
+            return {
+                'label': f"{seg['label']} (With Product)",
+                'error': 'No product avatar uploaded',
+                'status': 'failed',
+                'retry_count': 0,
+                'max_retries': 3
+            }
+    else:
+        avatar_url = avatar_normal_url
+        label_suffix = ""
     
-    data = {
-        'prompt': prompt,
-        'model': 'veo3_fast',
-        'aspect_ratio': aspect_ratio,
-        'enableTranslation': True
+    return {
+        'label': f"{seg['label']}{label_suffix}",
+        'status': 'pending',
+        'prompt': seg['prompt'],
+        'avatar_url': avatar_url,
+        'memo_key': memo_key_for(owner, seg['prompt'], avatar_url),
+        'retry_count': 0,
+        'max_retries': 3
     }
+
+def reuse_memoized(job):
+    """Complete a pending job straight away from an earlier identical generation, if there is one"""
+    memo = store.get_memo(job['memo_key']) if job.get('memo_key') else None
+    if memo is None:
+        return False
+    job['task_id'], job['video_url'] = memo
+    job['status'] = 'completed'
+    job['reused'] = 1
+    return True
+
+def submit_job(job):
+    """Submit an admitted job to Kie AI and persist the outcome"""
+    previous_task_id = job.get('task_id')
+    api_key = key_pool.secret(job.get('key_id')) or job['api_key']
+    result = kie.generate_video(api_key, job['prompt'], job['avatar_url'],
+                                callback_url=callback_url_for(job['batch_id']))
+    
+    if not result['success'] and key_pool.secret(job.get('key_id')):
+        if is_key_error(result['error'], result.get('code')):
+            # The pool key is dead, not the job - another key picks it up on the next dispatch
+            key_pool.disable(job['key_id'], result['error'])
+            return requeue_job(job, previous_task_id)
+        if result.get('code') == 429:
+            key_pool.mark_rate_limited(job['key_id'])
     
-    if image_url:
-        data['imageUrls'] = [image_url]
-        data['generationType'] = 'FIRST_AND_LAST_FRAMES_2_VIDEO'
+    if result['success']:
+        job['task_id'] = result['task_id']
+        job['status'] = 'queued'
+        job['error'] = None
+        job['raw_error'] = None
+        job['next_retry_at'] = None
+        job['submitted_at'] = time.time()
+        schedule_next_poll(job)
     else:
-        data['generationType'] = 'TEXT_2_VIDEO'
+        # Retry later if the error is transient
+        schedule_retry(job, result['error'], result.get('code'))
     
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result.get('code') == 200:
-            return {'success': True, 'task_id': result.get('data', {}).get('taskId')}
-        else:
-            error_msg = result.get('msg', 'Unknown error')
-            return {'success': False, 'error': error_msg}
-    except requests.exceptions.HTTPError as e:
-        # Handle HTTP errors (400, 500, etc.)
-        try:
-            error_data = e.response.json()
-            error_msg = error_data.get('msg', str(e))
-        except:
-            error_msg = str(e)
-        return {'success': False, 'error': f"HTTP {e.response.status_code}: {error_msg}"}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
-
-def check_status(api_key, task_id):
-    """Check generation status"""
-    url = f"{KIE_API_BASE}/veo/record-info"
-    headers = {'Authorization': f'Bearer {api_key}'}
-    params = {'taskId': task_id}
+    store.update_job(job, expected_task_id=previous_task_id)
+    return job
+
+def requeue_job(job, expected_task_id):
+    """Put a job back in the admission queue without counting it as a retry"""
+    job['status'] = 'pending'
+    job['key_id'] = None
+    job['task_id'] = None
+    job['next_poll_at'] = None
+    store.update_job(job, expected_task_id=expected_task_id)
+    return job
+
+def dispatch_pending(owner=None):
+    """Admit queued jobs while their API key has free task slots and submit them concurrently.
+
+    With owner (see batch_owner), only that owner's jobs; request handlers use this
+    so one user's request never waits on submitting everyone else's jobs.
+    """
+    now = time.time()
+    jobs = store.claim_pending(now, MAX_IN_FLIGHT_PER_KEY, pool_keys=key_pool.candidates(now), only_owner=owner)
+    if not jobs:
+        return []
     
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result.get('code') == 200:
-            data = result.get('data', {})
-            success_flag = data.get('successFlag')
-            
-            # Map successFlag to status
-            status_map = {
-                0: 'generating',
-                1: 'completed',
-                2: 'failed',
-                3: 'failed'
-            }
-            
-            video_url = None
-            error_msg = None
-            
-            if success_flag == 1 and data.get('response'):
-                response_data = data['response']
-                if response_data.get('resultUrls'):
-                    video_url = response_data['resultUrls'][0]
-            
-            if success_flag in [2, 3]:
-                error_msg = data.get('errorMessage', 'Generation failed')
-            
-            return {
-                'status': status_map.get(success_flag, 'unknown'),
-                'video_url': video_url,
-                'error': error_msg
-            }
-        else:
-            return {'status': 'failed', 'error': result.get('msg')}
-    except Exception as e:
-        return {'status': 'failed', 'error': str(e)}
+    workers = max(1, min(SUBMIT_CONCURRENCY, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(submit_job, jobs))
+
+def refresh_job(api_key, job, max_age=None):
+    """Check one in-flight job upstream (via the status cache), apply the result and persist it"""
+    task_id = job['task_id']
+    if job.get('key_id'):
+        # Tasks can only be looked up with the key that created them
+        api_key = key_pool.secret(job['key_id'])
+        if api_key is None:
+            # Key was removed from the pool; its task can't be followed any more
+            return requeue_job(job, task_id)
+    result = status_cache.check_status(api_key, task_id, max_age=max_age)
+    if (result.get('status') == 'error' and job.get('key_id')
+            and is_key_error(result.get('error'), result.get('code'))):
+        key_pool.disable(job['key_id'], result.get('error'))
+        return requeue_job(job, task_id)
+    apply_result(job, result)
+    store.update_job(job, expected_task_id=task_id)
+    return job
+
+def apply_result(job, result):
+    """Apply a check_status-style result to a job; failures go through the retry policy"""
+    if result.get('status') == 'error':
+        # The status lookup failed, not the render - keep polling unless it never will succeed
+        if classify_error(result.get('error'), result.get('code')) == TRANSIENT:
+            schedule_next_poll(job)
+            return job
+        result = dict(result, status='failed')
+    
+    job['status'] = result.get('status', 'unknown')
+    
+    if result.get('video_url'):
+        job['video_url'] = result['video_url']
+    
+    if job['status'] == 'completed' and job.get('memo_key') and job.get('video_url'):
+        store.remember(job['memo_key'], job['task_id'], job['video_url'], MEMO_TTL)
+    
+    if job['status'] == 'failed':
+        schedule_retry(job, result.get('error') or 'Unknown error', result.get('code'))
+    
+    schedule_next_poll(job)
+    return job
+
+def schedule_retry(job, error, code=None, now=None):
+    """Mark a failed job as retrying with backoff, or as failed if retrying can't help"""
+    now = now or time.time()
+    job['raw_error'] = error
+    job['error'] = parse_error_message(error)
+    
+    retry_count = job.get('retry_count') or 0
+    max_retries = job.get('max_retries', 3)
+    
+    if classify_error(error, code) == PERMANENT:
+        # Content filters, bad input, auth/credits: resubmitting would fail the same way
+        job['status'] = 'failed'
+        job['next_retry_at'] = None
+    elif retry_count < max_retries:
+        job['status'] = 'retrying'
+        job['retry_count'] = retry_count + 1
+        job['next_retry_at'] = now + backoff_delay(retry_count)
+    else:
+        job['status'] = 'failed'
+        job['next_retry_at'] = None
+        if retry_count:
+            job['error'] = f"Failed after {max_retries} attempts: {job['error']}"
+    return job
+
+def public_job(job):
+    """Job fields returned to the browser"""
+    return {key: value for key, value in job.items()
+            if key not in ('batch_id', 'api_key', 'key_id', 'memo_key', 'next_poll_at', 'next_retry_at',
+                           'updated_at')}
+
+def is_in_flight(job):
+    return job.get('status') in ['queued', 'generating'] and bool(job.get('task_id'))
+
+def schedule_next_poll(job, now=None):
+    """Set when the poller should next check this job (None once it's finished)"""
+    if not is_in_flight(job):
+        job['next_poll_at'] = None
+        return
+    now = now or time.time()
+    age = now - (job.get('submitted_at') or now - FIRST_POLL_AFTER)
+    job['next_poll_at'] = now + next_poll_delay(age, fallback=bool(PUBLIC_BASE_URL))
+
+def refresh_batch_inline(api_key, batch_id):
+    """Without a background poller: admit queued jobs and refresh in-flight jobs for one batch"""
+    dispatch_pending(batch_owner(store.get_batch(batch_id)['api_key']))
+    refresh_jobs(api_key, [job for job in store.get_jobs(batch_id) if is_in_flight(job)])
+
+def refresh_jobs(api_key, jobs):
+    """Refresh several jobs concurrently"""
+    if not jobs:
+        return
+    workers = max(1, min(SUBMIT_CONCURRENCY, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda job: refresh_job(api_key, job), jobs))
+
+def scheduler_tick():
+    """Background tick: admit queued jobs (including retries whose backoff elapsed), then poll due jobs"""
+    dispatch_pending()
+    
+    due = store.due_jobs(time.time())
+    if not due:
+        return
+    
+    workers = max(1, min(SUBMIT_CONCURRENCY, len(due)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda job: refresh_job(job['api_key'], job), due))
 
-def download_video(video_url, output_path):
-    """Download generated video"""
-    response = requests.get(video_url, stream=True)
-    response.raise_for_status()
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+status_poller = BackgroundPoller(
+    tick=scheduler_tick,
+    lock_path=str(Path(app.config['OUTPUT_FOLDER']) / '.poller.lock'),
+    interval=float(os.environ.get('POLL_TICK_SECONDS', '2')),
+)
+
+@app.before_request
+def start_background_poller():
+    if BACKGROUND_POLLER:
+        status_poller.start()
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', server_keys=bool(key_pool))
 
 @app.route('/api/upload-avatar', methods=['POST'])
 def upload_avatar_endpoint():
-    """Upload avatar image and return URL"""
+    """Upload avatar image and return URL (reusing a recent upload of the same image)"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
     file = request.files['file']
     api_key = request.form.get('api_key')
+    pool_key_id = None
     
+    if not api_key and key_pool:
+        pool_key_id, api_key = key_pool.pick(MAX_IN_FLIGHT_PER_KEY)
+        if not api_key:
+            return jsonify({'error': POOL_UNAVAILABLE_ERROR}), 503
     if not api_key:
         return jsonify({'error': 'Missing API key'}), 400
     
-    # Save file temporarily
-    temp_path = Path(app.config['UPLOAD_FOLDER']) / f"avatar_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-    file.save(temp_path)
+    # Read straight from the request into memory - no temp file round trip
+    content = file.stream.read(MAX_AVATAR_BYTES + 1)
+    if len(content) > MAX_AVATAR_BYTES:
+        return jsonify({'error': f'Avatar image is larger than {MAX_AVATAR_BYTES // (1024 * 1024)} MB'}), 413
     
-    try:
-        # Upload to Kie AI
-        avatar_url = upload_image(api_key, str(temp_path))
-        if not avatar_url:
-            return jsonify({'error': 'Failed to upload avatar to Kie AI'}), 500
-        
-        return jsonify({'avatar_url': avatar_url})
-    finally:
-        # Clean up temp file
-        if temp_path.exists():
-            temp_path.unlink()
+    # Uploads belong to a Kie account, so the same image is cached per API key
+    # (pool uploads are shared by the whole pool - any pool key can use the URL)
+    key_hash = 'pool' if pool_key_id else hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    cache_key = f"{key_hash}:{hashlib.sha256(content).hexdigest()}"
+    
+    avatar_url = store.get_cached_upload(cache_key)
+    if avatar_url:
+        return jsonify({'avatar_url': avatar_url, 'cached': True})
+    
+    # Upload to Kie AI
+    avatar_url = kie.upload_image(api_key, content, filename=file.filename or 'avatar.jpg',
+                                  content_type=file.mimetype or 'image/jpeg')
+    if not avatar_url:
+        return jsonify({'error': 'Failed to upload avatar to Kie AI'}), 500
+    
+    store.cache_upload(cache_key, avatar_url, AVATAR_URL_TTL)
+    return jsonify({'avatar_url': avatar_url, 'cached': False})
 
 @app.route('/api/generate', methods=['POST'])
 def generate():
@@ -245,344 +484,360 @@ def generate():
     avatar_normal_url = data.get('avatar_normal_url')
     avatar_product_url = data.get('avatar_product_url')
     
-    if not api_key or not script or not avatar_normal_url:
+    if (not api_key and not key_pool) or not script or not avatar_normal_url:
         return jsonify({'error': 'Missing API key, script, or normal avatar URL'}), 400
     
+    if not api_key and not key_pool.candidates():
+        # The batch would wait on the pool with nothing to run it
+        return jsonify({'error': POOL_UNAVAILABLE_ERROR}), 503
+    
     segments = parse_script(script)
     
     if not segments:
         return jsonify({'error': 'No segments found in script. Make sure each segment starts with a label (HOOK, Backend 1, etc.)'}), 400
     
-    jobs = []
-    
-    # Generate videos for each segment
-    for seg in segments:
-        # Determine which avatar to use
-        if seg['holding_product']:
-            if avatar_product_url:
-                avatar_url = avatar_product_url
-                label_suffix = " (With Product)"
-            else:
-                # No product avatar uploaded - skip with error
-                jobs.append({
-                    'label': f"{seg['label']} (With Product)",
-                    'error': 'No product avatar uploaded',
-                    'status': 'failed',
-                    'retry_count': 0,
-                    'max_retries': 3
-                })
-                continue
-        else:
-            avatar_url = avatar_normal_url
-            label_suffix = ""
-        
-        # Attempt to generate video
-        result = generate_video(api_key, seg['prompt'], avatar_url)
-        
-        if result['success']:
-            jobs.append({
-                'label': f"{seg['label']}{label_suffix}",
-                'task_id': result['task_id'],
-                'status': 'queued',
-                'prompt': seg['prompt'],
-                'avatar_url': avatar_url,
-                'retry_count': 0,
-                'max_retries': 3
-            })
-        else:
-            # Initial generation failed
-            jobs.append({
-                'label': f"{seg['label']}{label_suffix}",
-                'error': parse_error_message(result['error']),
-                'raw_error': result['error'],
-                'status': 'failed',
-                'prompt': seg['prompt'],
-                'avatar_url': avatar_url,
-                'retry_count': 0,
-                'max_retries': 3
-            })
-    
-    # Save job batch
+    # Jobs enter the admission queue; whatever fits under the key's in-flight limit
+    # is submitted right away, the rest as earlier tasks finish
     batch_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-    batch_file = Path(app.config['OUTPUT_FOLDER']) / f"batch_{batch_id}.json"
-    with open(batch_file, 'w') as f:
-        json.dump({'api_key': api_key, 'jobs': jobs}, f, indent=2)
+    owner = batch_owner(api_key)
+    jobs = [build_job(seg, avatar_normal_url, avatar_product_url, owner) for seg in segments]
+    if data.get('reuse_results'):
+        # Opt-in: unchanged segments from earlier runs complete instantly instead of re-rendering
+        reused = sum(reuse_memoized(job) for job in jobs if job['status'] == 'pending')
+        if reused:
+            print(f"Reused {reused}/{len(jobs)} segment(s) from earlier generations")
+    # Without a key of its own the batch runs on the server pool and stores no key at all
+    store.create_batch(batch_id, api_key or None, jobs)
+    # Only this batch's owner: other users' queues are the scheduler's job
+    dispatch_pending(owner)
     
-    return jsonify({'batch_id': batch_id, 'jobs': jobs})
+    return jsonify({'batch_id': batch_id, 'jobs': [public_job(job) for job in store.get_jobs(batch_id)]})
 
 @app.route('/api/status/<batch_id>', methods=['GET'])
 def status(batch_id):
-    """Check batch status and handle retries"""
-    batch_file = Path(app.config['OUTPUT_FOLDER']) / f"batch_{batch_id}.json"
-    if not batch_file.exists():
+    """Return the latest known batch status (kept fresh by the background poller).
+
+    Supports If-None-Match (304 when nothing changed) and ?since=<version>,
+    which returns only the jobs that changed after that batch version.
+    """
+    batch = store.get_batch(batch_id)
+    if batch is None:
         return jsonify({'error': 'Batch not found'}), 404
     
-    with open(batch_file, 'r') as f:
-        batch_data = json.load(f)
+    if not BACKGROUND_POLLER:
+        # No poller running anywhere - refresh inline like a plain request/response app
+        api_key = batch.get('api_key') or request.args.get('api_key')
+        if not api_key and not key_pool:
+            return jsonify({'error': 'Missing API key'}), 400
+        refresh_batch_inline(api_key, batch_id)
     
-    jobs = batch_data.get('jobs', [])
-    api_key = batch_data.get('api_key') or request.args.get('api_key')
+    # The batch version changes whenever any job visibly changes, so it doubles as the ETag.
+    # Read it before the jobs: a change landing in between is re-sent next time, never lost.
+    version = store.get_batch(batch_id)['version']
+    etag = f'{batch_id}-{version}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        since = request.args.get('since', type=int)
+        if since is not None:
+            # Delta mode: only jobs that changed after the client's last seen version
+            jobs = store.jobs_since(batch_id, since)
+        else:
+            jobs = store.get_jobs(batch_id)
+        response = jsonify({'version': version, 'jobs': [public_job(job) for job in jobs]})
     
-    if not api_key:
-        return jsonify({'error': 'Missing API key'}), 400
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/status/<batch_id>/stream', methods=['GET'])
+def status_stream(batch_id):
+    """Push job changes as Server-Sent Events (resumable via Last-Event-ID)"""
+    if store.get_batch(batch_id) is None:
+        return jsonify({'error': 'Batch not found'}), 404
     
-    # Update status for each job
-    for job in jobs:
-        if job.get('status') in ['queued', 'generating'] and job.get('task_id'):
-            try:
-                result = check_status(api_key, job['task_id'])
-                job['status'] = result.get('status', 'unknown')
-                
-                if result.get('video_url'):
-                    job['video_url'] = result['video_url']
-                
-                # Handle failed jobs with retry logic
-                if job['status'] == 'failed':
-                    job['raw_error'] = result.get('error', 'Unknown error')
-                    job['error'] = parse_error_message(job['raw_error'])
-                    
-                    # Attempt retry if under max retries
-                    retry_count = job.get('retry_count', 0)
-                    max_retries = job.get('max_retries', 3)
-                    
-                    if retry_count < max_retries:
-                        # Retry generation
-                        retry_result = generate_video(
-                            api_key, 
-                            job['prompt'], 
-                            job['avatar_url']
-                        )
-                        
-                        if retry_result['success']:
-                            job['task_id'] = retry_result['task_id']
-                            job['status'] = 'queued'
-                            job['retry_count'] = retry_count + 1
-                            job['error'] = None
-                            job['raw_error'] = None
-                        else:
-                            job['retry_count'] = retry_count + 1
-                            job['raw_error'] = retry_result['error']
-                            job['error'] = parse_error_message(retry_result['error'])
-                            if job['retry_count'] >= max_retries:
-                                job['error'] = f"Failed after {max_retries} attempts: {job['error']}"
-            except Exception as e:
-                job['error'] = str(e)
-    
-    # Save updated status
-    with open(batch_file, 'w') as f:
-        json.dump(batch_data, f, indent=2)
-    
-    return jsonify({'jobs': jobs})
-
-@app.route('/api/download/<batch_id>', methods=['POST'])
-def download_batch(batch_id):
-    """Download all completed videos as ZIP"""
-    batch_file = Path(app.config['OUTPUT_FOLDER']) / f"batch_{batch_id}.json"
-    if not batch_file.exists():
+    try:
+        last_version = int(request.headers.get('Last-Event-ID') or request.args.get('since') or 0)
+    except ValueError:
+        last_version = 0
+    api_key = request.args.get('api_key')
+    
+    def events():
+        nonlocal last_version
+        started = last_sent = last_refresh = time.time()
+        check_done = True
+        yield "retry: 3000\n\n"
+        
+        while time.time() - started < SSE_MAX_SECONDS:
+            now = time.time()
+            batch = store.get_batch(batch_id)
+            
+            if not BACKGROUND_POLLER and now - last_refresh >= 5:
+                # No poller running anywhere - the stream drives refreshes itself
+                refresh_batch_inline(batch.get('api_key') or api_key, batch_id)
+                last_refresh = now
+                batch = store.get_batch(batch_id)
+            
+            if batch['version'] > last_version:
+                for job in store.jobs_since(batch_id, last_version):
+                    yield f"id: {job['version']}\nevent: job\ndata: {json.dumps(public_job(job))}\n\n"
+                last_version = batch['version']
+                last_sent = now
+                check_done = True
+            elif now - last_sent >= SSE_HEARTBEAT_SECONDS:
+                yield ": heartbeat\n\n"
+                last_sent = now
+            
+            if check_done:
+                if all(job['status'] in TERMINAL_STATUSES for job in store.get_jobs(batch_id)):
+                    yield f"id: {last_version}\nevent: done\ndata: {{}}\n\n"
+                    return
+                check_done = False
+            
+            time.sleep(SSE_CHECK_SECONDS)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Upstream status lookups saved by the status cache (this worker process only)"""
+    return jsonify({'pid': os.getpid(), 'status_cache': status_cache.stats()})
+
+@app.route('/api/kie-callback', methods=['POST'])
+def kie_callback():
+    """Receive Kie AI completion callbacks and update the job immediately"""
+    batch_id = request.args.get('batch_id', '')
+    try:
+        task_id, result = KieClient.parse_callback(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not batch_id or not task_id:
+        return jsonify({'error': 'Missing batch_id or taskId'}), 400
+    
+    batch = store.get_batch(batch_id)
+    if batch is None:
         return jsonify({'error': 'Batch not found'}), 404
     
-    with open(batch_file, 'r') as f:
-        batch_data = json.load(f)
+    job = store.find_job_by_task(task_id, batch_id)
+    if job is None or not is_in_flight(job):
+        # Unknown, superseded by a retry, or already finished
+        return jsonify({'status': 'ignored'})
     
-    jobs = batch_data.get('jobs', [])
+    # Without a valid signed token the payload is only a hint: confirm it upstream
+    trusted = KIE_CALLBACK_SECRET and hmac.compare_digest(
+        request.args.get('token', ''), callback_token(batch_id))
     
-    # Download all completed videos
-    video_files = []
-    for job in jobs:
-        if job.get('status') == 'completed' and job.get('video_url'):
-            filename = f"{job['label'].replace(' ', '_')}.mp4"
-            filepath = Path(app.config['OUTPUT_FOLDER']) / filename
-            try:
-                download_video(job['video_url'], filepath)
-                video_files.append(filepath)
-            except Exception as e:
-                print(f"Failed to download {filename}: {e}")
+    if trusted:
+        apply_result(job, result)
+        store.update_job(job, expected_task_id=task_id)
+    else:
+        refresh_job(batch['api_key'], job, max_age=0)
+    
+    return jsonify({'status': 'ok'})
+
+@app.route('/api/download/<batch_id>', methods=['GET', 'POST'])
+def download_batch(batch_id):
+    """Stream all completed videos as a ZIP, served from the local video cache"""
+    if store.get_batch(batch_id) is None:
+        return jsonify({'error': 'Batch not found'}), 404
     
-    if not video_files:
+    completed = [job for job in store.get_jobs(batch_id)
+                 if job.get('status') == 'completed' and job.get('video_url')]
+    if not completed:
         return jsonify({'error': 'No completed videos to download'}), 404
     
     # Get custom batch name if provided
-    batch_name = None
+    batch_name = request.args.get('batch_name')
     if request.is_json:
-        batch_name = request.json.get('batch_name')
-
-    # Create ZIP with custom or default name
+        batch_name = request.json.get('batch_name') or batch_name
+    if batch_name:
+        batch_name = re.sub(r'[^A-Za-z0-9_-]', '_', batch_name)
     zip_filename = f"{batch_name}.zip" if batch_name else f"batch_{batch_id}.zip"
-    zip_path = Path(app.config['OUTPUT_FOLDER']) / zip_filename
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for video_file in video_files:
-            zipf.write(video_file, video_file.name)
-
-    return send_file(zip_path, as_attachment=True, download_name=zip_filename)
-
-def parse_vtt_subtitles(vtt_path):
-    """Parse VTT subtitle file into clean transcript text"""
-    with open(vtt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    lines = content.split('\n')
-    text_lines = []
-    seen = set()
-
-    for line in lines:
-        line = line.strip()
-        # Skip VTT headers, timestamps, and empty lines
-        if not line or line.startswith('WEBVTT') or line.startswith('Kind:') or line.startswith('Language:'):
-            continue
-        if '-->' in line:
-            continue
-        if line.isdigit():
-            continue
-
-        # Remove HTML tags (TikTok uses <b>, <i>, etc.)
-        clean = re.sub(r'<[^>]+>', '', line).strip()
-
-        if clean and clean not in seen:
-            seen.add(clean)
-            text_lines.append(clean)
-
-    result = ' '.join(text_lines)
-    # Clean Unicode line/paragraph separators
-    result = result.replace('\u2028', ' ').replace('\u2029', ' ')
-    return result
-
-
-def extract_transcript_from_url(url, openai_api_key=None):
-    """Extract transcript from a video URL (TikTok, YouTube Shorts, Instagram Reels)"""
-    if not HAS_YTDLP:
-        return {'success': False, 'error': 'yt-dlp not installed on server'}
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # Step 1: Try to extract subtitles (free, fast)
+    
+    # Keyed by job: reused jobs share their original's task_id but each gets its own entry
+    jobs_by_id = {job['id']: job for job in completed}
+    
+    def entries():
+        # Videos are fetched in parallel into the local cache (free if already cached)
+        # and added to the ZIP in the order they become available
+        used_names = set()
+        items = [(job['id'], job['task_id'], job['video_url']) for job in completed]
+        for job_id, video_file, error in video_cache.fetch_many(items):
+            job = jobs_by_id[job_id]
+            if error:
+                print(f"Failed to download {job['label']}: {error}")
+                continue
+            
+            name = f"{job['label'].replace(' ', '_')}.mp4"
+            counter = 2
+            while name in used_names:
+                name = f"{job['label'].replace(' ', '_')}_{counter}.mp4"
+                counter += 1
+            used_names.add(name)
+            yield name, iter_file(video_file)
+    
+    return Response(stream_with_context(iter_zip(entries())), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{zip_filename}"',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def iter_file(f):
+    """Iterate an open file in large chunks, closing it at the end"""
+    with f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            yield chunk
+
+def transcript_heartbeat():
+    """Background thread: keep this worker's queued and running transcript jobs marked alive"""
+    while True:
+        time.sleep(TRANSCRIPT_HEARTBEAT_SECONDS)
+        with local_transcript_jobs_lock:
+            job_ids = list(local_transcript_jobs)
         try:
-            ydl_opts = {
-                'writeautomaticsub': True,
-                'writesubtitles': True,
-                'subtitleslangs': ['en', 'en-US', 'en-GB', 'en-orig'],
-                'subtitlesformat': 'vtt',
-                'skip_download': True,
-                'outtmpl': os.path.join(tmpdir, 'subs'),
-                'quiet': True,
-                'no_warnings': True,
-                'socket_timeout': 30,
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-
-            # Look for any .vtt files
-            sub_files = glob.glob(os.path.join(tmpdir, '*.vtt'))
-
-            if sub_files:
-                transcript = parse_vtt_subtitles(sub_files[0])
-                if transcript and len(transcript.strip()) > 20:
-                    return {'success': True, 'transcript': transcript, 'method': 'subtitles'}
+            store.heartbeat_transcript_jobs(job_ids)
         except Exception as e:
-            print(f"Subtitle extraction error: {e}")
-
-        # Step 2: Fall back to Whisper API (needs OpenAI key + ffmpeg)
-        if not openai_api_key:
-            return {
-                'success': False,
-                'error': 'No captions found on this video. Enter an OpenAI API key to transcribe the audio with Whisper AI.'
-            }
+            print(f"Transcript heartbeat failed: {e}")
 
-        if not HAS_OPENAI:
-            return {'success': False, 'error': 'OpenAI package not installed on server'}
 
-        try:
-            # Download audio only
-            audio_opts = {
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '128',
-                }],
-                'outtmpl': os.path.join(tmpdir, 'audio.%(ext)s'),
-                'quiet': True,
-                'no_warnings': True,
-                'socket_timeout': 30,
-            }
-
-            with yt_dlp.YoutubeDL(audio_opts) as ydl:
-                ydl.download([url])
-
-            # Find the downloaded audio file
-            audio_files = glob.glob(os.path.join(tmpdir, 'audio.*'))
-            if not audio_files:
-                return {'success': False, 'error': 'Failed to download audio from this URL'}
-
-            # Transcribe with Whisper via direct HTTP (bypasses OpenAI SDK encoding issues)
-            whisper_url = "https://api.openai.com/v1/audio/transcriptions"
-            whisper_headers = {"Authorization": f"Bearer {openai_api_key}"}
+def submit_transcript_job(job_id, url):
+    """Run a transcript job on this worker's pool, with heartbeats until it finishes"""
+    global transcript_heartbeat_thread
+    with local_transcript_jobs_lock:
+        local_transcript_jobs.add(job_id)
+        if transcript_heartbeat_thread is None:
+            transcript_heartbeat_thread = threading.Thread(target=transcript_heartbeat, daemon=True,
+                                                           name='transcript-heartbeat')
+            transcript_heartbeat_thread.start()
+    future = transcript_executor.submit(run_transcript_job, job_id, url)
+    future.add_done_callback(lambda _: forget_transcript_job(job_id))
 
-            with open(audio_files[0], 'rb') as f:
-                whisper_response = requests.post(
-                    whisper_url,
-                    headers=whisper_headers,
-                    files={"file": (os.path.basename(audio_files[0]), f)},
-                    data={"model": "whisper-1", "response_format": "json"}
-                )
 
-            if whisper_response.status_code != 200:
-                error_detail = whisper_response.text[:200]
-                return {'success': False, 'error': f'Whisper API error ({whisper_response.status_code}): {error_detail}'}
+def forget_transcript_job(job_id):
+    with local_transcript_jobs_lock:
+        local_transcript_jobs.discard(job_id)
 
-            whisper_data = whisper_response.json()
-            transcript_text = whisper_data.get('text', '')
 
-            # Clean Unicode line/paragraph separators
-            transcript_text = transcript_text.replace('\u2028', ' ').replace('\u2029', ' ')
-
-            return {'success': True, 'transcript': transcript_text, 'method': 'whisper'}
+def run_transcript_job(job_id, url):
+    """Background worker: extract one transcript and record the outcome"""
+    store.update_transcript_job(job_id, status='running')
+    try:
+        result = extract_transcript_from_url(url, clean_api_key(os.environ.get('OPENAI_API_KEY')),
+                                             strategy=TRANSCRIPT_STRATEGY, transcriber=transcriber)
+    except Exception as e:
+        result = {'success': False, 'error': f'Transcript extraction failed: {str(e)}'}
 
-        except Exception as e:
-            return {'success': False, 'error': f'Whisper transcription failed: {str(e)}'}
+    if result['success']:
+        transcript_cache.put(url, result['transcript'], result['method'], result.get('metadata'))
+        store.update_transcript_job(job_id, status='completed', transcript=result['transcript'],
+                                    method=result['method'], metadata=result.get('metadata') or {})
+    else:
+        store.update_transcript_job(job_id, status='failed', error=result['error'])
+
+
+def load_transcript_job(job_id):
+    """Transcript job by id; jobs whose worker died or hung are reported as failed"""
+    job = store.get_transcript_job(job_id)
+    if job is None or job['status'] not in ('queued', 'running'):
+        return job
+    now = time.time()
+    if now - job['updated_at'] > TRANSCRIPT_JOB_TIMEOUT:
+        error = 'Transcript extraction timed out, please try again'
+    elif now - (job['heartbeat_at'] or job['updated_at']) > TRANSCRIPT_HEARTBEAT_TIMEOUT:
+        error = 'Transcript extraction was interrupted (server restarted), please try again'
+    else:
+        return job
+    store.update_transcript_job(job_id, status='failed', error=error)
+    return store.get_transcript_job(job_id)
+
+
+def public_transcript_job(job):
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'transcript': job['transcript'],
+        'method': job['method'],
+        'metadata': job['metadata'],
+        'error': job['error'],
+    }
 
 
 @app.route('/api/extract-transcript', methods=['POST'])
 def extract_transcript():
-    """Extract transcript from a video URL"""
+    """Start a transcript extraction job for a video URL (answered at once if cached)"""
     data = request.json
     url = data.get('url', '').strip()
-    openai_api_key = clean_api_key(os.environ.get('OPENAI_API_KEY'))
 
     if not url:
         return jsonify({'error': 'No URL provided'}), 400
 
-    result = extract_transcript_from_url(url, openai_api_key)
-
-    if result['success']:
-        return jsonify({
-            'transcript': result['transcript'],
-            'method': result['method']
-        })
-    else:
-        return jsonify({'error': result['error']}), 400
-
-
-@app.route('/api/chunk-transcript', methods=['POST'])
-def chunk_transcript():
-    """Use Claude AI to intelligently chunk a raw transcript into Veo 3 segments"""
-    if not HAS_ANTHROPIC:
-        return jsonify({'error': 'Anthropic package not installed on server'}), 500
-
-    data = request.json
-    raw_text = data.get('raw_text', '').strip()
-    tonality = data.get('tonality', 'an informational tone')
-    api_key = clean_api_key(os.environ.get('ANTHROPIC_API_KEY'))
-
-    if not raw_text:
-        return jsonify({'error': 'No transcript text provided'}), 400
-
-    if not api_key:
-        return jsonify({'error': 'Anthropic API key required for AI chunking'}), 400
-
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-
-        prompt = f"""You are a transcript chunker for short-form AI avatar videos. Split this raw transcript into video segments.
+    video_key = canonical_video_key(url)
+
+    # The same video pasted again (any URL variant) skips yt-dlp and Whisper entirely
+    cached = transcript_cache.get(url)
+    if cached:
+        job = store.create_transcript_job(uuid.uuid4().hex, url, video_key, status='completed', **cached)
+        return jsonify(dict(public_transcript_job(job), cached=True))
+
+    # Someone is already extracting this video - follow that job instead of starting another
+    job = store.find_active_transcript_job(video_key, TRANSCRIPT_JOB_TIMEOUT, TRANSCRIPT_HEARTBEAT_TIMEOUT)
+    if job is None:
+        if store.count_active_transcript_jobs(TRANSCRIPT_JOB_TIMEOUT, TRANSCRIPT_HEARTBEAT_TIMEOUT) >= TRANSCRIPT_MAX_ACTIVE:
+            response = jsonify({'error': 'Too many transcript extractions in progress, please try again shortly'})
+            response.headers['Retry-After'] = '30'
+            return response, 429
+        job = store.create_transcript_job(uuid.uuid4().hex, url, video_key)
+        submit_transcript_job(job['id'], url)
+
+    return jsonify(dict(public_transcript_job(job), cached=False)), 202
+
+
+@app.route('/api/transcript-jobs/<job_id>', methods=['GET'])
+def transcript_job_status(job_id):
+    job = load_transcript_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Transcript job not found'}), 404
+    return jsonify(public_transcript_job(job))
+
+
+@app.route('/api/transcript-jobs/<job_id>/stream', methods=['GET'])
+def transcript_job_stream(job_id):
+    """Push transcript job status changes as Server-Sent Events until it finishes"""
+    if store.get_transcript_job(job_id) is None:
+        return jsonify({'error': 'Transcript job not found'}), 404
+
+    def events():
+        started = last_sent = time.time()
+        last_status = None
+        yield "retry: 3000\n\n"
+
+        while time.time() - started < SSE_MAX_SECONDS:
+            job = load_transcript_job(job_id)
+            if job['status'] in ('completed', 'failed'):
+                yield f"event: done\ndata: {json.dumps(public_transcript_job(job))}\n\n"
+                return
+            if job['status'] != last_status:
+                yield f"event: status\ndata: {json.dumps(public_transcript_job(job))}\n\n"
+                last_status = job['status']
+                last_sent = time.time()
+            elif time.time() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                yield ": heartbeat\n\n"
+                last_sent = time.time()
+            time.sleep(SSE_CHECK_SECONDS)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def chunk_prompt(raw_text):
+    """The instructions Claude gets for splitting a transcript"""
+    return f"""You are a transcript chunker for short-form AI avatar videos. Split this raw transcript into video segments.
 
 STRICT RULES:
 1. Each chunk MUST be 25-27 words. Acceptable range: 23-28. Count words very carefully.
@@ -604,43 +859,176 @@ RAW TRANSCRIPT:
 Return ONLY a valid JSON array. Each element: {{"label": "...", "text": "..."}}
 No markdown, no code blocks, no explanation — just the raw JSON array."""
 
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=4096,
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        response_text = message.content[0].text.strip()
-
-        # Handle potential markdown code block wrapping
-        if response_text.startswith('```'):
-            response_text = response_text.split('\n', 1)[1].rsplit('```', 1)[0].strip()
+def claude_client(api_key, timeout=None):
+    """Anthropic client; ANTHROPIC_BASE_URL (e.g. fake_upstream.py) is picked up by the SDK"""
+    # With a timeout the caller has a fallback, so don't spend it on retries
+    options = {'timeout': timeout, 'max_retries': 0} if timeout else {}
+    return anthropic.Anthropic(api_key=api_key, **options)
+
+def chunk_with_claude(raw_text, api_key, timeout=None):
+    """Ask Claude to split raw_text, then check and repair its chunks; returns (texts, report).
+
+    Raises on API errors, and ValueError when the response holds no usable chunks.
+    """
+    client = claude_client(api_key, timeout)
+    message = client.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=4096,
+        messages=[{"role": "user", "content": chunk_prompt(raw_text)}]
+    )
+    chunks = parse_chunk_response(message.content[0].text)
+
+    # Whatever local rebalancing can't fix goes back to Claude - just those chunks
+    return repair_chunks(chunks, rewrite=lambda texts: rewrite_with_claude(client, texts))
+
+def rewrite_with_claude(client, texts):
+    """Targeted re-ask: have Claude fit only the given chunks into the word range"""
+    prompt = f"""Each of these video script segments must be 25-27 words (acceptable range: 23-28). Rewrite each one to fit: if it is short, add brief natural transitions ("Now,", "First,", "For example,", "Next,"); if it is long, trim filler and tighten the wording. Keep the meaning, facts and conversational tone. Do not merge or split segments.
+
+SEGMENTS:
+{json.dumps(texts, ensure_ascii=False, indent=1)}
+
+Return ONLY a JSON array of {len(texts)} strings, in the same order. No markdown, no explanation."""
+
+    message = client.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=2048,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return [chunk['text'] for chunk in parse_chunk_response(message.content[0].text)]
+
+def read_chunk_request():
+    """(raw_text, tonality, mode, api_key, error_response) for a chunking request"""
+    data = request.json
+    raw_text = data.get('raw_text', '').strip()
+    tonality = data.get('tonality', 'an informational tone')
+    mode = data.get('mode') or CHUNK_MODE
+    api_key = clean_api_key(os.environ.get('ANTHROPIC_API_KEY'))
 
-        chunks = json.loads(response_text)
+    error = None
+    if mode not in CHUNK_MODES:
+        error = jsonify({'error': f"mode must be one of {', '.join(CHUNK_MODES)}"}), 400
+    elif not raw_text:
+        error = jsonify({'error': 'No transcript text provided'}), 400
+    elif mode == 'ai' and not HAS_ANTHROPIC:
+        error = jsonify({'error': 'Anthropic package not installed on server'}), 500
+    elif mode == 'ai' and not api_key:
+        error = jsonify({'error': 'Anthropic API key required for AI chunking'}), 400
+    # 'auto' without Claude available is served by the fast chunker
+    elif mode == 'auto' and not (HAS_ANTHROPIC and api_key):
+        mode = 'unavailable'
+    return raw_text, tonality, mode, api_key, error
+
+def chunk_error(error_msg):
+    """(message, HTTP status) for a failed Claude call"""
+    if 'authentication' in error_msg.lower() or 'api key' in error_msg.lower():
+        return 'Invalid Anthropic API key', 401
+    return f'AI chunking failed: {error_msg}', 500
+
+CHUNK_FALLBACK_WARNINGS = {
+    'unavailable': 'AI chunking unavailable, used fast chunking',
+    'invalid': 'AI returned an invalid format, used fast chunking',
+    'failed': 'AI chunking failed, used fast chunking',
+}
 
-        # Format with Veo 3 prompt structure
-        formatted_chunks = []
-        for chunk in chunks:
-            text = chunk['text']
-            word_count = len(text.split())
-            label = chunk['label']
+@app.route('/api/chunk-transcript', methods=['POST'])
+def chunk_transcript():
+    """Chunk a raw transcript into Veo 3 segments with Claude ('ai'), locally ('fast'), or Claude with a local fallback ('auto')"""
+    raw_text, tonality, mode, api_key, error = read_chunk_request()
+    if error:
+        return error
 
-            formatted_chunks.append({
-                'label': label,
-                'text': text,
-                'wordCount': word_count,
-                'formatted': f'{label}\nNO CAPTIONS ON SCREEN. NO CAMERA MOVEMENTS. NO EDITS. NO BACKGROUND MUSIC.\nHandheld phone video style, Make the avatar say in {tonality}:\n"{text}"'
-            })
+    if mode == 'fast':
+        return jsonify({'chunks': chunk_transcript_locally(raw_text, tonality), 'mode': 'fast'})
+    if mode == 'unavailable':
+        return jsonify({'chunks': chunk_transcript_locally(raw_text, tonality), 'mode': 'fast',
+                        'warning': CHUNK_FALLBACK_WARNINGS['unavailable']})
 
-        return jsonify({'chunks': formatted_chunks})
+    try:
+        texts, repairs = chunk_with_claude(raw_text, api_key, timeout=CHUNK_AI_TIMEOUT if mode == 'auto' else None)
 
-    except json.JSONDecodeError:
-        return jsonify({'error': 'AI returned invalid format. Please try again.'}), 500
+        # Format with Veo 3 prompt structure
+        formatted_chunks = [format_chunk(chunk_label(index), text, tonality) for index, text in enumerate(texts)]
+        return jsonify({'chunks': formatted_chunks, 'mode': 'ai', 'repairs': repairs})
+
+    except ValueError as e:
+        # Nothing usable in Claude's response: the local chunker still gives a valid split
+        print(f"AI chunking returned no usable chunks: {e}")
+        return jsonify({'chunks': chunk_transcript_locally(raw_text, tonality), 'mode': 'fast',
+                        'warning': CHUNK_FALLBACK_WARNINGS['invalid']})
     except Exception as e:
         error_msg = str(e)
-        if 'authentication' in error_msg.lower() or 'api key' in error_msg.lower():
-            return jsonify({'error': 'Invalid Anthropic API key'}), 401
-        return jsonify({'error': f'AI chunking failed: {error_msg}'}), 500
+        if mode == 'auto':
+            print(f"AI chunking failed, falling back to fast chunking: {error_msg}")
+            return jsonify({'chunks': chunk_transcript_locally(raw_text, tonality), 'mode': 'fast',
+                            'warning': CHUNK_FALLBACK_WARNINGS['failed']})
+        message, status = chunk_error(error_msg)
+        return jsonify({'error': message}), status
+
+@app.route('/api/chunk-transcript/stream', methods=['POST'])
+def chunk_transcript_stream():
+    """Same as /api/chunk-transcript, streamed as NDJSON while Claude writes.
+
+    One {"type": "chunk"} line per chunk as soon as it is complete, then a
+    {"type": "done"} line with the final, repaired chunks (which replace the
+    streamed ones), or {"type": "error"}.
+    """
+    raw_text, tonality, mode, api_key, error = read_chunk_request()
+    if error:
+        return error
+
+    def line(payload):
+        return json.dumps(payload) + '\n'
+
+    def local_lines(warning=None):
+        chunks = chunk_transcript_locally(raw_text, tonality)
+        for chunk in chunks:
+            yield line({'type': 'chunk', 'chunk': chunk})
+        done = {'type': 'done', 'chunks': chunks, 'mode': 'fast'}
+        if warning:
+            done['warning'] = CHUNK_FALLBACK_WARNINGS[warning]
+        yield line(done)
+
+    def lines():
+        if mode in ('fast', 'unavailable'):
+            yield from local_lines('unavailable' if mode == 'unavailable' else None)
+            return
+
+        chunks = []
+        try:
+            client = claude_client(api_key, timeout=CHUNK_AI_TIMEOUT if mode == 'auto' else None)
+            parser = ChunkStreamParser()
+            with client.messages.stream(
+                model=CLAUDE_MODEL,
+                max_tokens=4096,
+                messages=[{"role": "user", "content": chunk_prompt(raw_text)}]
+            ) as stream:
+                for text in stream.text_stream:
+                    for chunk in parser.feed(text):
+                        yield line({'type': 'chunk', 'chunk': format_chunk(chunk_label(len(chunks)), chunk['text'], tonality)})
+                        chunks.append(chunk)
+            if not chunks:
+                raise ValueError('No chunks in response')
+
+            texts, repairs = repair_chunks(chunks, rewrite=lambda texts: rewrite_with_claude(client, texts))
+            formatted_chunks = [format_chunk(chunk_label(index), text, tonality) for index, text in enumerate(texts)]
+            yield line({'type': 'done', 'chunks': formatted_chunks, 'mode': 'ai', 'repairs': repairs})
+
+        except ValueError as e:
+            print(f"AI chunking returned no usable chunks: {e}")
+            yield from local_lines('invalid')
+        except Exception as e:
+            error_msg = str(e)
+            if mode == 'auto':
+                print(f"AI chunking failed, falling back to fast chunking: {error_msg}")
+                yield from local_lines('failed')
+            else:
+                yield line({'type': 'error', 'error': chunk_error(error_msg)[0]})
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 
 if __name__ == '__main__':
@@ -0,0 +1,161 @@
+"""
+Audio pipeline - shrink, split and transcribe audio with Whisper in parallel
+
+Whisper accepts at most 25 MB per request, and a full-quality MP3 of a long
+video blows through that. Audio is re-encoded to what speech recognition
+actually uses (mono, 16 kHz, low bitrate), cut into chunks at silences near
+CHUNK_SECONDS boundaries, and the chunks are transcribed concurrently and
+stitched back together in order.
+
+Needs ffmpeg/ffprobe on PATH for preprocessing and splitting; without them
+the original file is uploaded as one request (fine for short clips).
+"""
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HAS_FFMPEG = bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+WHISPER_URL = "https://api.openai.com/v1/audio/transcriptions"
+WHISPER_MAX_BYTES = 25 * 1024 * 1024
+
+# Speech-only encoding: ~240 KB per minute, so even a 10 minute chunk is a few MB
+SAMPLE_RATE = 16000
+BITRATE = '32k'
+
+# Silence detection: quieter than NOISE_DB for at least MIN_SILENCE seconds
+NOISE_DB = -35
+MIN_SILENCE = 0.4
+
+SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+
+
+def _run(args):
+    return subprocess.run(args, capture_output=True, text=True, check=True)
+
+
+def preprocess(src_path, dst_path):
+    """Downmix to mono 16 kHz low-bitrate MP3"""
+    _run(['ffmpeg', '-nostdin', '-y', '-i', src_path, '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+          '-c:a', 'libmp3lame', '-b:a', BITRATE, dst_path])
+    return dst_path
+
+
+def probe_duration(path):
+    output = _run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                   '-of', 'default=noprint_wrappers=1:nokey=1', path]).stdout
+    return float(output.strip() or 0)
+
+
+def find_silences(path):
+    """[(start, end)] of silent stretches, from ffmpeg's silencedetect filter"""
+    log = _run(['ffmpeg', '-nostdin', '-i', path, '-af',
+                f'silencedetect=noise={NOISE_DB}dB:d={MIN_SILENCE}', '-f', 'null', '-']).stderr
+    starts = [float(value) for value in SILENCE_START.findall(log)]
+    ends = [float(value) for value in SILENCE_END.findall(log)]
+    return list(zip(starts, ends))
+
+
+def plan_chunks(duration, silences, chunk_seconds, search_seconds=None):
+    """Split [0, duration] into (start, end) chunks of about chunk_seconds.
+
+    Each cut goes in the middle of the silence closest to the ideal cut point
+    (within search_seconds, default a fifth of a chunk) so words aren't split;
+    with no silence nearby the cut is made at the ideal point. A last chunk
+    shorter than search_seconds is merged into the one before.
+    """
+    if search_seconds is None:
+        search_seconds = chunk_seconds / 5
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+
+    chunks = []
+    start = 0.0
+    while duration - start > chunk_seconds:
+        ideal = start + chunk_seconds
+        nearby = [point for point in midpoints
+                  if abs(point - ideal) <= search_seconds and start < point < duration]
+        cut = min(nearby, key=lambda point: abs(point - ideal)) if nearby else ideal
+        chunks.append((start, cut))
+        start = cut
+    if chunks and duration - start < search_seconds:
+        # A few seconds of tail on their own are mostly silence, which Whisper pads with
+        # hallucinated text; they go on the end of the previous chunk instead
+        start = chunks.pop()[0]
+    chunks.append((start, duration))
+    return chunks
+
+
+def split(path, chunks, out_dir):
+    """Write each (start, end) range of path to its own file; returns the paths in order"""
+    paths = []
+    for index, (start, end) in enumerate(chunks):
+        chunk_path = os.path.join(out_dir, f'chunk_{index:03d}.mp3')
+        _run(['ffmpeg', '-nostdin', '-y', '-ss', f'{start:.3f}', '-t', f'{end - start:.3f}',
+              '-i', path, '-c', 'copy', chunk_path])
+        paths.append(chunk_path)
+    return paths
+
+
+class Transcriber:
+    """Whisper client that preprocesses, chunks and transcribes audio files"""
+
+    def __init__(self, api_url=WHISPER_URL, chunk_seconds=600, concurrency=4, timeout=300):
+        self.api_url = api_url
+        self.chunk_seconds = chunk_seconds
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def transcribe_file(self, path, api_key):
+        """One Whisper request; returns the text or raises RuntimeError"""
+        with open(path, 'rb') as f:
+            response = self.session.post(
+                self.api_url,
+                headers={"Authorization": f"Bearer {api_key}"},
+                files={"file": (os.path.basename(path), f)},
+                data={"model": "whisper-1", "response_format": "json"},
+                timeout=self.timeout
+            )
+        if response.status_code != 200:
+            raise RuntimeError(f'Whisper API error ({response.status_code}): {response.text[:200]}')
+        return response.json().get('text', '').strip()
+
+    def chunk_files(self, audio_path, work_dir):
+        """Preprocess and split audio_path; returns chunk file paths in order"""
+        if not HAS_FFMPEG:
+            return [audio_path]
+        small_path = preprocess(audio_path, os.path.join(work_dir, 'speech.mp3'))
+        duration = probe_duration(small_path)
+        if duration <= self.chunk_seconds:
+            return [small_path]
+        chunks = plan_chunks(duration, find_silences(small_path), self.chunk_seconds)
+        return split(small_path, chunks, work_dir)
+
+    def transcribe(self, audio_path, api_key, work_dir):
+        """Result dict: {'success', 'transcript', 'method'} or {'success': False, 'error'}"""
+        try:
+            paths = self.chunk_files(audio_path, work_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            return {'success': False, 'error': f'Audio preprocessing failed: {str(e)}'}
+
+        too_big = [path for path in paths if os.path.getsize(path) > WHISPER_MAX_BYTES]
+        if too_big:
+            return {'success': False, 'error': 'Audio is too long to transcribe (install ffmpeg to split it)'}
+
+        try:
+            workers = max(1, min(self.concurrency, len(paths)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map() keeps chunk order regardless of which finishes first
+                texts = list(executor.map(lambda path: self.transcribe_file(path, api_key), paths))
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+        transcript = ' '.join(text for text in texts if text)
+        # Clean Unicode line/paragraph separators
+        transcript = transcript.replace('\u2028', ' ').replace('\u2029', ' ')
+        return {'success': True, 'transcript': transcript, 'method': 'whisper'}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time to first chunk, streamed vs. non-streamed AI chunking
+
+Runs the app against the fake Claude endpoint in fake_upstream.py (which
+answers at --token-delay seconds per text delta) and compares
+/api/chunk-transcript with /api/chunk-transcript/stream for transcripts of
+different lengths.
+
+    python bench_chunk_stream.py --token-delay 0.02 --sentences 20 80 200
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+from fake_upstream import start_fake_server
+
+SENTENCES = [
+    "If you're always tired, even after a full night of sleep, your body is trying to tell you something.",
+    "That means you could be running low on iron.",
+    "Iron carries oxygen to every cell, and without enough of it you feel drained all day.",
+    "Most people never get tested until the symptoms are hard to ignore.",
+    "A simple blood test at your next checkup can tell you where you stand.",
+]
+
+
+def make_transcript(count):
+    return ' '.join(SENTENCES[i % len(SENTENCES)] for i in range(count))
+
+
+def time_plain(base_url, text):
+    """(seconds to first chunk, seconds total, chunks) - the first chunk arrives with the rest"""
+    start = time.perf_counter()
+    response = requests.post(f'{base_url}/api/chunk-transcript', json={'raw_text': text, 'mode': 'ai'})
+    elapsed = time.perf_counter() - start
+    data = response.json()
+    if response.status_code != 200 or data.get('mode') != 'ai':
+        print(f"❌ /api/chunk-transcript returned {response.status_code}: {data}")
+        sys.exit(1)
+    return elapsed, elapsed, len(data['chunks'])
+
+
+def time_stream(base_url, text):
+    """(seconds to first chunk, seconds total, chunks)"""
+    start = time.perf_counter()
+    first = None
+    with requests.post(f'{base_url}/api/chunk-transcript/stream', json={'raw_text': text, 'mode': 'ai'},
+                       stream=True) as response:
+        for line in response.iter_lines():
+            event = json.loads(line)
+            if event['type'] == 'chunk' and first is None:
+                first = time.perf_counter() - start
+            elif event['type'] == 'done':
+                return first, time.perf_counter() - start, len(event['chunks'])
+            elif event['type'] == 'error':
+                print(f"❌ Stream error: {event['error']}")
+                sys.exit(1)
+    print("❌ Stream ended without a done event")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.3, help='fake Claude latency before the first token (seconds)')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed text deltas')
+    parser.add_argument('--sentences', type=int, nargs='+', default=[20, 80, 200])
+    args = parser.parse_args()
+
+    fake, state, fake_url = start_fake_server(latency=args.latency, token_delay=args.token_delay)
+    os.environ['ANTHROPIC_BASE_URL'] = fake_url
+    os.environ['ANTHROPIC_API_KEY'] = 'bench-key'
+    os.environ['BACKGROUND_POLLER'] = '0'
+    # Keep every store the app opens out of outputs/
+    workdir = tempfile.mkdtemp(prefix='veo-bench-')
+    os.environ['JOB_DB_PATH'] = os.path.join(workdir, 'jobs.db')
+    os.environ['RATE_LIMIT_DB_PATH'] = os.path.join(workdir, 'rate_limits.db')
+    os.environ['TRANSCRIPT_CACHE_PATH'] = os.path.join(workdir, 'transcripts.db')
+    os.environ['VIDEO_CACHE_DIR'] = os.path.join(workdir, 'video_cache')
+
+    import app as veo_app
+    if not veo_app.HAS_ANTHROPIC:
+        print("❌ The anthropic package is required (pip install -r requirements.txt)")
+        sys.exit(1)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, veo_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    print("=" * 72)
+    print(f"CHUNK STREAMING BENCHMARK (latency {args.latency * 1000:.0f} ms, {args.token_delay * 1000:.0f} ms per delta)")
+    print("=" * 72)
+    print(f"{'sentences':>10} {'chunks':>7} {'plain first (s)':>16} {'stream first (s)':>17} {'stream total (s)':>17}")
+
+    for count in args.sentences:
+        text = make_transcript(count)
+        plain_first, _, plain_chunks = time_plain(base_url, text)
+        stream_first, stream_total, stream_chunks = time_stream(base_url, text)
+        if plain_chunks != stream_chunks:
+            print(f"❌ Chunk count mismatch: {plain_chunks} vs {stream_chunks}")
+            sys.exit(1)
+        print(f"{count:>10} {stream_chunks:>7} {plain_first:>16.2f} {stream_first:>17.2f} {stream_total:>17.2f}")
+
+    server.shutdown()
+    fake.shutdown()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parse_script time vs. script size
+
+Generates scripts of 10 to 10,000 segments (multi-line prompts, HOLDING
+PRODUCT markers, malformed label-like lines) and times the line-based parser
+against the regex parser it replaced, checking both produce the same
+segments. Time per segment should stay flat for the line-based parser.
+
+    python bench_parse_script.py --counts 10 100 1000 10000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from script_parser import parse_script
+
+# The parser parse_script replaced, kept here as the reference
+REGEX_PATTERN = r'^([A-Z][A-Za-z0-9\s]+?)(\s*—\s*HOLDING PRODUCT)?\s*\n(.*?)(?=\n^[A-Z][A-Za-z0-9\s]+?(?:\s*—\s*HOLDING PRODUCT)?\s*\n|\Z)'
+
+
+def regex_parse_script(script_text):
+    return [{'label': label.strip(), 'prompt': prompt.strip(), 'holding_product': bool(holding_product)}
+            for label, holding_product, prompt in re.findall(REGEX_PATTERN, script_text, re.DOTALL | re.MULTILINE)]
+
+
+def make_script(count, seed=0):
+    """Build a formatted script with `count` segments"""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(count):
+        label = 'HOOK' if i == 0 else rng.choice(['Backend', 'HOOK V', 'Body', 'CTA']) + f' {i}'
+        if rng.random() < 0.3:
+            label += ' — HOLDING PRODUCT'
+        lines = [f'NO CAPTIONS ON SCREEN. Make the avatar say: "Segment number {i}."']
+        for _ in range(rng.randint(0, 3)):
+            lines.append(rng.choice([
+                'Camera: handheld, natural light, slight push-in.',
+                'Tone - upbeat, friendly; (smiles at the end)',
+                'Note: keep it under 8 seconds!',
+                # Malformed label from a table pasted out of a doc: the regex backtracks over the padding
+                'Alt take' + ' ' * rng.randint(50, 400) + '(optional)',
+            ]))
+        parts.append(label + '\n' + '\n'.join(lines))
+    return '\n\n'.join(parts)
+
+
+def best_time(parse, script, repeat):
+    """Fastest of `repeat` runs, in seconds, and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        segments = parse(script)
+        best = min(best, time.perf_counter() - start)
+    return best, segments
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print("PARSE_SCRIPT BENCHMARK")
+    print("=" * 72)
+    print(f"{'segments':>10} {'KB':>8} {'regex (ms)':>12} {'lines (ms)':>12} {'µs/segment':>12} {'speedup':>9}")
+
+    for count in args.counts:
+        script = make_script(count)
+        regex_time, expected = best_time(regex_parse_script, script, args.repeat)
+        line_time, segments = best_time(parse_script, script, args.repeat)
+
+        if segments != expected or len(segments) != count:
+            print(f"❌ Parsers disagree on a {count}-segment script")
+            sys.exit(1)
+        # CRLF line endings must not change the result
+        if parse_script(script.replace('\n', '\r\n')) != segments:
+            print(f"❌ CRLF script parsed differently ({count} segments)")
+            sys.exit(1)
+
+        print(f"{count:>10} {len(script) / 1024:>8.0f} {regex_time * 1000:>12.1f} {line_time * 1000:>12.1f} "
+              f"{line_time / count * 1e6:>12.1f} {regex_time / line_time:>8.1f}x")
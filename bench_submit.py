@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/generate submit latency vs. segment count
+
+Runs the app against a local fake Kie AI endpoint (see fake_upstream.py) and
+compares serial submission with concurrent submission.
+
+    python bench_submit.py --latency 0.3 --counts 1 5 15 40
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from fake_upstream import start_fake_server
+
+
+def make_script(count):
+    """Build a formatted script with `count` segments"""
+    parts = []
+    for i in range(count):
+        label = 'HOOK' if i == 0 else f'Backend {i}'
+        parts.append(f'{label}\nNO CAPTIONS ON SCREEN. Make the avatar say: "Segment number {i}."')
+    return '\n\n'.join(parts)
+
+
+def time_generate(client, count):
+    """POST one batch and return (seconds, jobs)"""
+    payload = {
+        'api_key': 'bench-key',
+        'script': make_script(count),
+        'avatar_normal_url': 'http://127.0.0.1/avatar.jpg',
+    }
+    start = time.perf_counter()
+    response = client.post('/api/generate', json=payload)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        print(f"❌ /api/generate returned {response.status_code}: {response.get_data(as_text=True)}")
+        sys.exit(1)
+    return elapsed, response.get_json()['jobs']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.3, help='fake upstream latency per call (seconds)')
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 5, 15, 40])
+    parser.add_argument('--concurrency', type=int, default=None, help='override SUBMIT_CONCURRENCY')
+    args = parser.parse_args()
+
+    server, state, base_url = start_fake_server(latency=args.latency)
+    os.environ['KIE_API_BASE'] = f'{base_url}/api/v1'
+    os.environ['BACKGROUND_POLLER'] = '0'
+    # Nothing polls the fake tasks to completion, so don't let admission control hold jobs back
+    os.environ['MAX_IN_FLIGHT_PER_KEY'] = '1000000'
+    # Measure submit concurrency, not the per-key submit rate limit
+    os.environ['KIE_SUBMIT_BUDGET'] = '0,1'
+    # Keep every store the app opens out of outputs/
+    workdir = tempfile.mkdtemp(prefix='veo-bench-')
+    os.environ['JOB_DB_PATH'] = os.path.join(workdir, 'jobs.db')
+    os.environ['RATE_LIMIT_DB_PATH'] = os.path.join(workdir, 'rate_limits.db')
+    os.environ['TRANSCRIPT_CACHE_PATH'] = os.path.join(workdir, 'transcripts.db')
+    os.environ['VIDEO_CACHE_DIR'] = os.path.join(workdir, 'video_cache')
+
+    import app as veo_app
+    client = veo_app.app.test_client()
+    concurrency = args.concurrency or veo_app.SUBMIT_CONCURRENCY
+
+    print("=" * 60)
+    print(f"SUBMIT BENCHMARK (upstream latency {args.latency * 1000:.0f} ms, concurrency {concurrency})")
+    print("=" * 60)
+    print(f"{'segments':>10} {'serial (s)':>12} {'concurrent (s)':>16} {'speedup':>9}")
+
+    for count in args.counts:
+        veo_app.SUBMIT_CONCURRENCY = 1
+        serial, _ = time_generate(client, count)
+
+        veo_app.SUBMIT_CONCURRENCY = concurrency
+        concurrent, jobs = time_generate(client, count)
+
+        # Order must match the script regardless of completion order
+        labels = [job['label'] for job in jobs]
+        expected = ['HOOK'] + [f'Backend {i}' for i in range(1, count)]
+        if labels != expected:
+            print(f"❌ Job order mismatch for {count} segments")
+            sys.exit(1)
+
+        print(f"{count:>10} {serial:>12.2f} {concurrent:>16.2f} {serial / concurrent:>8.1f}x")
+
+    server.shutdown()
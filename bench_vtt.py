@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: VTT parsing on multi-hour rolling auto-captions
+
+Writes YouTube-style auto-caption files (each cue repeats the previous line,
+inline word timings, ~10 ms transition cues, and the odd line really said
+twice) and compares the streaming parser with the old read-everything parser
+that dropped any line it had seen before: time, peak memory, and how many
+words each gets wrong against the words actually spoken.
+
+    python bench_vtt.py --hours 1 3 6
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from vtt_parser import parse_vtt_subtitles
+
+VOCABULARY = ('so the thing about this product is that it really works for me and honestly I was '
+              'surprised how fast you can see results if you use it every day').split()
+LINE_SECONDS = 2.0
+
+
+def legacy_parse_vtt_subtitles(vtt_path):
+    """The previous parser: whole file in memory, exact repeated lines dropped"""
+    with open(vtt_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    text_lines = []
+    seen = set()
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('WEBVTT') or line.startswith('Kind:') or line.startswith('Language:'):
+            continue
+        if '-->' in line or line.isdigit():
+            continue
+        clean = re.sub(r'<[^>]+>', '', line).strip()
+        if clean and clean not in seen:
+            seen.add(clean)
+            text_lines.append(clean)
+    return ' '.join(text_lines)
+
+
+def timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}'
+
+
+def write_rolling_vtt(path, hours, seed=0):
+    """Write a rolling auto-caption file; returns the spoken words"""
+    rng = random.Random(seed)
+    spoken = []
+    previous = None
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('WEBVTT\nKind: captions\nLanguage: en\n\n')
+        for i in range(int(hours * 3600 / LINE_SECONDS)):
+            if previous is not None and rng.random() < 0.02:
+                line = list(previous)  # Said twice
+            else:
+                line = rng.choices(VOCABULARY, k=rng.randint(3, 9))
+            spoken.extend(line)
+            start = i * LINE_SECONDS
+            step = (LINE_SECONDS - 0.01) / len(line)
+            timed = line[0] + ''.join(f'<{timestamp(start + step * n)}><c> {word}</c>'
+                                      for n, word in enumerate(line[1:], 1))
+            f.write(f'{timestamp(start)} --> {timestamp(start + LINE_SECONDS - 0.01)} align:start position:0%\n')
+            f.write((' '.join(previous) + '\n' if previous else '') + timed + '\n\n')
+            f.write(f'{timestamp(start + LINE_SECONDS - 0.01)} --> {timestamp(start + LINE_SECONDS)} '
+                    f'align:start position:0%\n{" ".join(line)}\n\n')
+            previous = line
+    return spoken
+
+
+def word_errors(words, spoken):
+    """Words missing plus words extra compared with what was said, counted as a bag of words"""
+    if words == spoken:
+        return 0
+    counts = {}
+    for word in spoken:
+        counts[word] = counts.get(word, 0) + 1
+    for word in words:
+        counts[word] = counts.get(word, 0) - 1
+    return sum(abs(count) for count in counts.values())
+
+
+def measure(parse, path):
+    """(seconds, peak MB, words); memory is traced in a second run so it doesn't skew the time"""
+    start = time.perf_counter()
+    words = parse(path).split()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    parse(path)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak, words
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, nargs='+', default=[1, 3, 6])
+    args = parser.parse_args()
+
+    print("=" * 84)
+    print("VTT PARSER BENCHMARK (rolling auto-captions)")
+    print("=" * 84)
+    print(f"{'hours':>6} {'MB':>6} {'words':>8} | {'old s':>7} {'old MB':>7} {'old errors':>10} | "
+          f"{'new s':>7} {'new MB':>7} {'new errors':>10}")
+
+    workdir = tempfile.mkdtemp(prefix='vtt-bench-')
+    for hours in args.hours:
+        path = os.path.join(workdir, f'captions_{hours}h.vtt')
+        spoken = write_rolling_vtt(path, hours)
+        size = os.path.getsize(path) / 1024 / 1024
+
+        old_time, old_peak, old_words = measure(legacy_parse_vtt_subtitles, path)
+        new_time, new_peak, new_words = measure(parse_vtt_subtitles, path)
+        new_errors = word_errors(new_words, spoken)
+
+        print(f"{hours:>6g} {size:>6.1f} {len(spoken):>8} | {old_time:>7.2f} {old_peak:>7.1f} "
+              f"{word_errors(old_words, spoken):>10} | {new_time:>7.2f} {new_peak:>7.1f} {new_errors:>10}")
+        os.remove(path)
+        if new_words != spoken:
+            print(f"❌ Streaming parser output differs from the spoken words ({new_errors} word errors)")
+            sys.exit(1)
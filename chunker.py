@@ -0,0 +1,368 @@
+"""
+Chunker - split a transcript into HOOK/Backend segments locally, without an LLM
+
+Sentences are grouped (a sentence like "That means ..." stays with the one
+before it), then dynamic programming over the sentence boundaries picks the
+split whose chunks deviate least from the 25-27 word target, with anything
+outside 23-28 words heavily penalised and a last chunk under 23 words ruled
+out (it is merged into the one before). A sentence too long for one chunk is
+broken at clause boundaries, or - auto-captions have no punctuation at all -
+into even runs of words. Runs in milliseconds and gives the same output for
+the same input.
+
+The same rules check (and repair) chunks that come back from Claude: labels
+are reassigned by position, and runs of chunks outside the word range are
+re-split at sentence boundaries together with their neighbours before anyone
+has to ask the LLM again.
+"""
+import json
+import re
+
+MIN_WORDS = 23
+MAX_WORDS = 28
+TARGET_MIN = 25
+TARGET_MAX = 27
+# Words per piece when a run of words has no sentence or clause break to split at
+TARGET = 26
+# Cost per word outside MIN_WORDS..MAX_WORDS, dwarfing the in-window cost
+OUT_OF_RANGE_PENALTY = 1000
+
+# A sentence ends at . ! or ? (and any closing quote/bracket) followed by whitespace, so the
+# dots in "$19.99", "example.com" or "0.5" don't end one
+SENTENCE_END = re.compile(r'[.!?]+["\'”’)\]]*(?=\s|$)')
+# Sentences that only make sense after the previous one (cause -> effect)
+DEPENDENT = re.compile(r"(That\s+(means|is|was|usually)|It'?s\s|You\s+need|This\s+(means|is|was)|"
+                       r"Which\s+(means|is|usually))", re.IGNORECASE)
+CLAUSE_BREAK = re.compile(r'(?<=[,;:—])\s+')
+ABBREVIATIONS = re.compile(r'\b(Mr|Mrs|Ms|Dr|Prof|Sr|Jr|St|vs|etc|e\.g|i\.e|approx|No)\.$', re.IGNORECASE)
+WORD = re.compile(r'\S+')
+
+CODE_FENCE = re.compile(r'^\s*```[\w-]*\s*$', re.MULTILINE)
+
+VEO_DIRECTIONS = 'NO CAPTIONS ON SCREEN. NO CAMERA MOVEMENTS. NO EDITS. NO BACKGROUND MUSIC.'
+
+
+def split_sentences(text):
+    """(start, end) spans of the sentences in text; abbreviations like "Dr." don't end one"""
+    spans = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        if ABBREVIATIONS.search(text, start, match.end()):
+            continue
+        if text[start:match.end()].strip():
+            spans.append((start, match.end()))
+        start = match.end()
+        while start < len(text) and text[start].isspace():
+            start += 1
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+
+def count_words(text, span):
+    return len(text[span[0]:span[1]].split())
+
+
+def split_words(text, span):
+    """Break a span of text into even runs of about TARGET words, none over MAX_WORDS"""
+    words = [match.span() for match in WORD.finditer(text, *span)]
+    count = max(-(-len(words) // MAX_WORDS), round(len(words) / TARGET))
+    size, extra = divmod(len(words), count)
+    pieces = []
+    first = 0
+    for index in range(count):
+        last = first + size + (1 if index < extra else 0)
+        pieces.append((words[first][0], words[last - 1][1]))
+        first = last
+    return pieces
+
+
+def group_sentences(text, sentences):
+    """Attach dependent sentences to the one before, and break overlong ones at clause boundaries
+    (or, failing that, between words); takes and returns spans of text"""
+    grouped = []
+    for start, end in sentences:
+        if grouped and DEPENDENT.match(text, start):
+            grouped[-1] = (grouped[-1][0], end)
+        else:
+            grouped.append((start, end))
+
+    units = []
+    for unit in grouped:
+        if count_words(text, unit) <= MAX_WORDS:
+            units.append(unit)
+            continue
+        # Too long for one chunk: pack clauses into pieces of at most MAX_WORDS
+        clauses = []
+        start = unit[0]
+        for match in CLAUSE_BREAK.finditer(text, *unit):
+            clauses.append((start, match.start()))
+            start = match.end()
+        clauses.append((start, unit[1]))
+        pieces = []
+        piece = None
+        for clause in clauses:
+            if piece and count_words(text, (piece[0], clause[1])) > MAX_WORDS:
+                pieces.append(piece)
+                piece = None
+            piece = (piece[0] if piece else clause[0], clause[1])
+        pieces.append(piece)
+        # A clause that is still too long (unpunctuated captions) is split between words
+        for piece in pieces:
+            units.extend(split_words(text, piece) if count_words(text, piece) > MAX_WORDS else [piece])
+    return units
+
+
+def chunk_cost(words):
+    """How far a chunk of `words` words is from the target"""
+    if TARGET_MIN <= words <= TARGET_MAX:
+        return 0
+    distance = TARGET_MIN - words if words < TARGET_MIN else words - TARGET_MAX
+    cost = distance * distance
+    if words < MIN_WORDS:
+        cost += OUT_OF_RANGE_PENALTY * (MIN_WORDS - words)
+    elif words > MAX_WORDS:
+        cost += OUT_OF_RANGE_PENALTY * (words - MAX_WORDS)
+    return cost
+
+
+def split_units(counts):
+    """Chunk boundaries [(start, end)] over units with these word counts, minimising total cost"""
+    n = len(counts)
+    best = [0] + [float('inf')] * n
+    previous = [0] * (n + 1)
+    for end in range(1, n + 1):
+        words = 0
+        for start in range(end - 1, -1, -1):
+            words += counts[start]
+            # Longer chunks only get worse once past the window (a single unit is always allowed)
+            if words > 2 * MAX_WORDS and start < end - 1:
+                break
+            # The last chunk must still be at least MIN_WORDS, unless it's the only one
+            if end == n and start > 0 and words < MIN_WORDS:
+                continue
+            cost = best[start] + chunk_cost(words)
+            if cost < best[end]:
+                best[end], previous[end] = cost, start
+
+    bounds = []
+    end = n
+    while end > 0:
+        bounds.append((previous[end], end))
+        end = previous[end]
+    return bounds[::-1]
+
+
+def chunk_label(index):
+    return 'HOOK' if index == 0 else f'Backend {index}'
+
+
+def chunk_texts(raw_text):
+    """Split raw_text into chunk texts of about 25-27 words, at sentence boundaries where there are any.
+
+    Chunks are slices of the text (with runs of whitespace collapsed), so the words are never changed.
+    """
+    text = ' '.join(raw_text.split())
+    units = group_sentences(text, split_sentences(text))
+    if not units:
+        return []
+    counts = [count_words(text, unit) for unit in units]
+    return [text[units[start][0]:units[end - 1][1]] for start, end in split_units(counts)]
+
+
+def format_chunk(label, text, tonality):
+    """Chunk in the shape the UI expects, with the Veo 3 prompt structure"""
+    return {
+        'label': label,
+        'text': text,
+        'wordCount': len(text.split()),
+        'formatted': f'{label}\n{VEO_DIRECTIONS}\nHandheld phone video style, Make the avatar say in {tonality}:\n"{text}"'
+    }
+
+
+def chunk_transcript_locally(raw_text, tonality):
+    """Formatted HOOK/Backend N chunks for raw_text"""
+    return [format_chunk(chunk_label(index), text, tonality) for index, text in enumerate(chunk_texts(raw_text))]
+
+
+def parse_chunk_response(response_text):
+    """[{'label', 'text'}] from an LLM response.
+
+    Tolerates code fences, prose around the array and a truncated array (the
+    complete elements before the cut are kept). Elements may be objects with
+    a 'text' or bare strings. Raises ValueError when nothing usable is found.
+    """
+    text = CODE_FENCE.sub('', response_text)
+    start = text.find('[')
+    if start == -1:
+        raise ValueError('No JSON array in response')
+
+    decoder = json.JSONDecoder()
+    try:
+        items = decoder.raw_decode(text, start)[0]
+    except ValueError:
+        # Cut off mid-array: keep every element that decodes
+        items = []
+        position = start + 1
+        while True:
+            while position < len(text) and text[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(text) or text[position] == ']':
+                break
+            try:
+                item, position = decoder.raw_decode(text, position)
+            except ValueError:
+                break
+            items.append(item)
+
+    chunks = []
+    for item in items:
+        if isinstance(item, dict):
+            label, item_text = item.get('label'), item.get('text')
+        else:
+            label, item_text = None, item
+        if isinstance(item_text, str) and item_text.strip():
+            chunks.append({'label': label, 'text': ' '.join(item_text.split())})
+    if not chunks:
+        raise ValueError('No chunks in response')
+    return chunks
+
+
+def in_range(text):
+    return MIN_WORDS <= len(text.split()) <= MAX_WORDS
+
+
+def rebalance(texts):
+    """Re-split each run of out-of-range chunks with one neighbour either side, where that helps.
+
+    Only the boundaries between chunks move: the new chunks are slices of the old ones joined.
+    """
+    texts = list(texts)
+    index = 0
+    while index < len(texts):
+        if in_range(texts[index]):
+            index += 1
+            continue
+        end = index
+        while end < len(texts) and not in_range(texts[end]):
+            end += 1
+        start, stop = max(0, index - 1), min(len(texts), end + 1)
+
+        # The chunks are joined as they are and cut again at sentence boundaries; a re-split that
+        # would change the text in any way (not just where it is cut) is never taken
+        old = texts[start:stop]
+        joined = ' '.join(old)
+        new = chunk_texts(joined)
+        if (' '.join(new) == joined and
+                sum(chunk_cost(len(text.split())) for text in new) < sum(chunk_cost(len(text.split())) for text in old)):
+            texts[start:stop] = new
+            stop = start + len(new)
+        index = stop
+    return texts
+
+
+def repair_chunks(chunks, rewrite=None):
+    """Check LLM chunks against the rules and fix what can be fixed; returns (texts, report).
+
+    Labels are reassigned HOOK, Backend 1, ...; out-of-range chunks are
+    rebalanced locally, and only those still out of range are passed to
+    rewrite(texts) -> texts (e.g. a targeted re-ask), keeping each rewrite
+    only if it lands closer to the target. The report counts chunks that
+    were mislabelled, out of range, rewritten, and still out of range at
+    the end ('remaining').
+    """
+    texts = [chunk['text'] for chunk in chunks]
+    report = {
+        'relabelled': sum(1 for index, chunk in enumerate(chunks) if chunk.get('label') != chunk_label(index)),
+        'out_of_range': sum(1 for text in texts if not in_range(text)),
+        'rewritten': 0,
+    }
+    texts = rebalance(texts)
+
+    bad = [index for index, text in enumerate(texts) if not in_range(text)]
+    if bad and rewrite is not None:
+        try:
+            rewritten = rewrite([texts[index] for index in bad])
+        except Exception as e:
+            print(f"Chunk rewrite failed: {e}")
+            rewritten = []
+        if len(rewritten) == len(bad):
+            for index, text in zip(bad, rewritten):
+                text = ' '.join(str(text).split())
+                if chunk_cost(len(text.split())) < chunk_cost(len(texts[index].split())):
+                    texts[index] = text
+                    report['rewritten'] += 1
+
+    report['remaining'] = sum(1 for text in texts if not in_range(text))
+    return texts, report
+
+
+class ChunkStreamParser:
+    """Incremental parser for a JSON array of chunks arriving in pieces (an LLM stream).
+
+    feed() returns the elements completed by that piece, as parse_chunk_response
+    would return them; each character is scanned once.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.element_start = None
+        self.started = False
+        self.finished = False
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        while self.position < len(self.buffer) and not self.finished:
+            char = self.buffer[self.position]
+            self.position += 1
+            if not self.started:
+                # Skip code fences or any preamble before the array
+                if char == '[':
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        completed.extend(self._element())
+                continue
+
+            if char == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.element_start = self.position - 1
+            elif char in '{[':
+                if self.depth == 1:
+                    self.element_start = self.position - 1
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 1:
+                    completed.extend(self._element())
+                elif self.depth == 0:
+                    self.finished = True
+
+        # Completed text is never looked at again
+        if self.element_start is None:
+            self.buffer, self.position = self.buffer[self.position:], 0
+        return completed
+
+    def _element(self):
+        """The element that just closed, parsed and normalised (empty list if it isn't a chunk)"""
+        text = self.buffer[self.element_start:self.position]
+        self.element_start = None
+        try:
+            return parse_chunk_response(f'[{text}]')
+        except ValueError:
+            return []
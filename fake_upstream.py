@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Kie AI API, used by the benchmarks and for manual testing
+
+Run standalone and point the app at it:
+    python fake_upstream.py --port 9100 --latency 0.3
+    KIE_API_BASE=http://127.0.0.1:9100/api/v1 python app.py
+
+When a submission carries a callBackUrl (PUBLIC_BASE_URL set on the app), the
+fake posts a Kie-style completion callback to it after --render-seconds.
+
+It also answers Whisper-style /v1/audio/transcriptions uploads (point
+WHISPER_API_URL at http://127.0.0.1:9100/v1/audio/transcriptions); the
+returned text is the uploaded file's content when that is UTF-8.
+
+And an Anthropic-style /v1/messages (point ANTHROPIC_BASE_URL at
+http://127.0.0.1:9100): chunking prompts are answered with the local
+chunker's split as a JSON array, streamed in small text deltas
+--token-delay seconds apart when the request asks for a stream.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+import re
+import uuid
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from chunker import chunk_label, chunk_texts
+
+RAW_TRANSCRIPT = re.compile(r'RAW TRANSCRIPT:\n"""(.*?)"""', re.DOTALL)
+SEGMENTS = re.compile(r'SEGMENTS:\n(.*?)\n\nReturn', re.DOTALL)
+DELTA_CHARS = 12
+
+
+class FakeUpstream:
+    """Shared state for the fake server (tasks, latency, call counters)"""
+
+    def __init__(self, latency=0.3, render_seconds=5.0, video_size=256 * 1024, callbacks=True, token_delay=0.01):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.callbacks = callbacks
+        self.render_seconds = render_seconds
+        self.video_size = video_size
+        self.tasks = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def send_callback(self, task_id, callback_url, host):
+        """POST a Kie-style completion callback, like Kie does when a render finishes"""
+        payload = {
+            'code': 200,
+            'msg': 'Veo3 video generated successfully.',
+            'data': {
+                'taskId': task_id,
+                'info': {'resultUrls': [f'http://{host}/videos/{task_id}.mp4']},
+                'fallbackFlag': False
+            }
+        }
+        body = json.dumps(payload).encode('utf-8')
+        req = urllib.request.Request(callback_url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(req, timeout=10).close()
+            self.count('callback')
+        except Exception as e:
+            print(f"Fake callback to {callback_url} failed: {e}")
+
+
+def multipart_file(content_type, body):
+    """Bytes of the 'file' field of a multipart/form-data body, or None"""
+    message = BytesParser(policy=default).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode('latin-1') + body)
+    for part in message.iter_parts():
+        if part.get_param('name', header='content-disposition') == 'file':
+            return part.get_payload(decode=True)
+    return None
+
+
+def claude_reply(prompt):
+    """What the fake Claude answers: the local chunker's split, or the segments it was asked to rewrite"""
+    match = RAW_TRANSCRIPT.search(prompt)
+    if match:
+        texts = chunk_texts(match.group(1))
+        return json.dumps([{'label': chunk_label(index), 'text': text} for index, text in enumerate(texts)], indent=2)
+    match = SEGMENTS.search(prompt)
+    return match.group(1) if match else '[]'
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def _send_sse(self, events):
+            """Stream (event, payload) pairs as Server-Sent Events over chunked encoding"""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for event, payload in events:
+                data = f'event: {event}\ndata: {json.dumps(payload)}\n\n'.encode('utf-8')
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+
+        def _claude_events(self, message, text):
+            yield 'message_start', {'type': 'message_start', 'message': dict(message, content=[])}
+            yield 'content_block_start', {'type': 'content_block_start', 'index': 0,
+                                          'content_block': {'type': 'text', 'text': ''}}
+            for start in range(0, len(text), DELTA_CHARS):
+                time.sleep(state.token_delay)
+                yield 'content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                              'delta': {'type': 'text_delta', 'text': text[start:start + DELTA_CHARS]}}
+            yield 'content_block_stop', {'type': 'content_block_stop', 'index': 0}
+            yield 'message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                    'usage': {'output_tokens': len(text) // 4}}
+            yield 'message_stop', {'type': 'message_stop'}
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self._read_body()
+            time.sleep(state.latency)
+
+            if path == '/api/v1/veo/generate':
+                state.count('generate')
+                data = json.loads(body or b'{}')
+                if not data.get('prompt'):
+                    return self._send_json({'code': 400, 'msg': 'prompt is required'})
+                task_id = uuid.uuid4().hex
+                with state.lock:
+                    state.tasks[task_id] = {'created': time.time(), 'request': data}
+                if state.callbacks and data.get('callBackUrl'):
+                    timer = threading.Timer(state.render_seconds, state.send_callback,
+                                            args=(task_id, data['callBackUrl'], self.headers.get('Host')))
+                    timer.daemon = True
+                    timer.start()
+                return self._send_json({'code': 200, 'msg': 'success', 'data': {'taskId': task_id}})
+
+            if path == '/api/file-stream-upload':
+                state.count('upload')
+                name = uuid.uuid4().hex
+                host = self.headers.get('Host')
+                return self._send_json({
+                    'success': True,
+                    'code': 200,
+                    'data': {'downloadUrl': f'http://{host}/files/{name}.jpg'}
+                })
+
+            if path == '/v1/messages':
+                state.count('messages')
+                data = json.loads(body or b'{}')
+                prompt = data['messages'][-1]['content']
+                text = claude_reply(prompt if isinstance(prompt, str) else prompt[0]['text'])
+                message = {
+                    'id': f'msg_{uuid.uuid4().hex[:24]}', 'type': 'message', 'role': 'assistant',
+                    'model': data.get('model'), 'content': [{'type': 'text', 'text': text}],
+                    'stop_reason': 'end_turn', 'stop_sequence': None,
+                    'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4},
+                }
+                if data.get('stream'):
+                    return self._send_sse(self._claude_events(message, text))
+                # Same generation time as the streamed reply, just all at the end
+                time.sleep(state.token_delay * -(-len(text) // DELTA_CHARS))
+                return self._send_json(message)
+
+            if path == '/v1/audio/transcriptions':
+                state.count('transcribe')
+                audio = multipart_file(self.headers.get('Content-Type', ''), body)
+                if audio is None:
+                    return self._send_json({'error': {'message': 'file is required'}}, status=400)
+                # The "transcript" is the uploaded file itself when it's text, so tests can check ordering
+                try:
+                    text = audio.decode('utf-8')
+                except UnicodeDecodeError:
+                    text = f'[{len(audio)} bytes]'
+                return self._send_json({'text': text})
+
+            self._send_json({'code': 404, 'msg': 'not found'}, status=404)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            path = parsed.path
+
+            if path == '/api/v1/veo/record-info':
+                state.count('record-info')
+                time.sleep(state.latency)
+                task_id = parse_qs(parsed.query).get('taskId', [''])[0]
+                with state.lock:
+                    task = state.tasks.get(task_id)
+                if not task:
+                    return self._send_json({'code': 404, 'msg': 'task not found'})
+                done = time.time() - task['created'] >= state.render_seconds
+                host = self.headers.get('Host')
+                data = {'taskId': task_id, 'successFlag': 1 if done else 0}
+                if done:
+                    data['response'] = {'resultUrls': [f'http://{host}/videos/{task_id}.mp4']}
+                return self._send_json({'code': 200, 'msg': 'success', 'data': data})
+
+            if path.startswith('/videos/'):
+                state.count('video')
+                # Honour "Range: bytes=N-" so resumed downloads can be exercised
+                offset = 0
+                range_header = self.headers.get('Range', '')
+                if range_header.startswith('bytes=') and range_header.endswith('-'):
+                    offset = min(int(range_header[len('bytes='):-1]), state.video_size)
+                self.send_response(206 if offset else 200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Content-Length', str(state.video_size - offset))
+                if offset:
+                    self.send_header('Content-Range', f'bytes {offset}-{state.video_size - 1}/{state.video_size}')
+                self.end_headers()
+                block = b'\0' * 65536
+                remaining = state.video_size - offset
+                while remaining > 0:
+                    n = min(remaining, len(block))
+                    self.wfile.write(block[:n])
+                    remaining -= n
+                return
+
+            self._send_json({'code': 404, 'msg': 'not found'}, status=404)
+
+    return Handler
+
+
+def start_fake_server(port=0, **kwargs):
+    """Start the fake server on a background thread, return (server, state, base_url)"""
+    state = FakeUpstream(**kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    return server, state, base_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Kie AI API for local testing')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds added to every API call')
+    parser.add_argument('--render-seconds', type=float, default=5.0, help='seconds until a task completes')
+    parser.add_argument('--no-callbacks', action='store_true', help="don't POST to callBackUrl on completion")
+    parser.add_argument('--token-delay', type=float, default=0.01, help='seconds between streamed Claude text deltas')
+    args = parser.parse_args()
+
+    server, state, base_url = start_fake_server(
+        port=args.port, latency=args.latency, render_seconds=args.render_seconds,
+        callbacks=not args.no_callbacks, token_delay=args.token_delay
+    )
+    print(f"🧪 Fake Kie AI running at {base_url}")
+    print(f"   KIE_API_BASE={base_url}/api/v1")
+    print(f"   ANTHROPIC_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
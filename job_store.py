@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+"""
+Job store - batches and jobs in SQLite (WAL mode), one row per job, plus the
+small shared caches that sit next to them (uploaded avatar URLs)
+
+Safe to share across threads and gunicorn workers: every update touches a
+single job row inside its own transaction, so concurrent pollers, callbacks
+and status requests never rewrite (or lose) each other's changes.
+
+Migrate legacy outputs/batch_<id>.json files manually with:
+    python job_store.py outputs/jobs.db outputs/
+"""
+import glob
+import hashlib
+import json
+from collections import OrderedDict
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Job columns that callers may read and update
+JOB_FIELDS = (
+    'label', 'task_id', 'status', 'prompt', 'avatar_url', 'video_url',
+    'error', 'raw_error', 'retry_count', 'max_retries', 'submitted_at', 'next_poll_at',
+    'next_retry_at', 'queue_position', 'key_id', 'memo_key', 'reused',
+)
+
+# Fields that only drive scheduling; changing them doesn't bump a batch's version
+INTERNAL_FIELDS = ('submitted_at', 'next_poll_at', 'next_retry_at')
+
+# Columns added after the first release: (table, column, declaration)
+ADDED_COLUMNS = (
+    ('batches', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('jobs', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('jobs', 'next_retry_at', 'REAL'),
+    ('jobs', 'queue_position', 'INTEGER'),
+    ('jobs', 'key_id', 'TEXT'),
+    ('jobs', 'memo_key', 'TEXT'),
+    ('jobs', 'reused', 'INTEGER NOT NULL DEFAULT 0'),
+    ('transcript_jobs', 'heartbeat_at', 'REAL'),
+)
+
+# Queued/running transcript job that is neither hung (updated_at) nor orphaned by a dead worker (heartbeat_at)
+ACTIVE_TRANSCRIPT_JOB = ("status IN ('queued', 'running') AND updated_at > ? "
+                         "AND COALESCE(heartbeat_at, updated_at) > ?")
+
+# Waiting for admission ('retrying' jobs rejoin the queue once their backoff elapses)
+PENDING_STATUSES = ('pending', 'retrying')
+IN_FLIGHT_STATUSES = ('queued', 'generating')
+# Jobs holding one of an API key's concurrent-task slots
+ADMITTED_STATUSES = ('submitting',) + IN_FLIGHT_STATUSES
+TERMINAL_STATUSES = ('completed', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    api_key TEXT,
+    created_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL REFERENCES batches(batch_id),
+    position INTEGER NOT NULL,
+    label TEXT,
+    task_id TEXT,
+    status TEXT NOT NULL,
+    prompt TEXT,
+    avatar_url TEXT,
+    video_url TEXT,
+    error TEXT,
+    raw_error TEXT,
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    max_retries INTEGER NOT NULL DEFAULT 3,
+    submitted_at REAL,
+    next_poll_at REAL,
+    next_retry_at REAL,
+    queue_position INTEGER,
+    key_id TEXT,
+    memo_key TEXT,
+    reused INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs(batch_id, position);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch_version ON jobs(batch_id, version);
+CREATE INDEX IF NOT EXISTS idx_jobs_task ON jobs(task_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_jobs_next_poll ON jobs(next_poll_at) WHERE next_poll_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_jobs_next_retry ON jobs(next_retry_at) WHERE next_retry_at IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS avatar_uploads (
+    cache_key TEXT PRIMARY KEY,
+    download_url TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS memo (
+    memo_key TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS transcript_jobs (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    video_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    transcript TEXT,
+    method TEXT,
+    metadata TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_jobs_active ON transcript_jobs(video_key, status);
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    key_id TEXT PRIMARY KEY,
+    disabled_until REAL,
+    disabled_reason TEXT,
+    rate_limited_at REAL
+);
+"""
+
+
+class JobStore:
+    """SQLite-backed store for batches and their jobs"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections must not cross threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: explicit BEGIN/COMMIT only, no implicit transactions
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        # Bring databases created by older releases up to date before (re)creating indexes
+        for table, column, declaration in ADDED_COLUMNS:
+            columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if columns and column not in columns:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+        conn.executescript(SCHEMA)
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    @staticmethod
+    def _job_dict(row):
+        return dict(row) if row is not None else None
+
+    def create_batch(self, batch_id, api_key, jobs, created_at=None):
+        """Insert a batch and its jobs atomically; returns the jobs with their row ids"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO batches (batch_id, api_key, created_at, version) VALUES (?, ?, ?, 1)',
+                (batch_id, api_key, created_at or now)
+            )
+            self._insert_jobs(conn, batch_id, jobs, now)
+        return self.get_jobs(batch_id)
+
+    @staticmethod
+    def _insert_jobs(conn, batch_id, jobs, now):
+        for position, job in enumerate(jobs):
+            values = {field: job.get(field) for field in JOB_FIELDS}
+            values['retry_count'] = values['retry_count'] or 0
+            values['reused'] = values['reused'] or 0
+            if values['max_retries'] is None:
+                values['max_retries'] = 3
+            columns = ', '.join(JOB_FIELDS)
+            placeholders = ', '.join('?' for _ in JOB_FIELDS)
+            conn.execute(
+                f'INSERT INTO jobs (batch_id, position, updated_at, version, {columns}) '
+                f'VALUES (?, ?, ?, 1, {placeholders})',
+                (batch_id, position, now, *[values[field] for field in JOB_FIELDS])
+            )
+
+    def get_batch(self, batch_id):
+        row = self._conn().execute('SELECT * FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_jobs(self, batch_id):
+        """All jobs of a batch in script order"""
+        rows = self._conn().execute(
+            'SELECT * FROM jobs WHERE batch_id = ? ORDER BY position', (batch_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def jobs_since(self, batch_id, version):
+        """Jobs of a batch that changed after `version`, oldest change first"""
+        rows = self._conn().execute(
+            'SELECT * FROM jobs WHERE batch_id = ? AND version > ? ORDER BY version',
+            (batch_id, version)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_job_by_task(self, task_id, batch_id):
+        """The batch's job currently tracking an upstream task_id"""
+        row = self._conn().execute(
+            'SELECT * FROM jobs WHERE task_id = ? AND batch_id = ?', (task_id, batch_id)
+        ).fetchone()
+        return self._job_dict(row)
+
+    def update_job(self, job, expected_task_id=None):
+        """Persist a job dict's fields to its row.
+
+        Compare-and-set: the write only happens if the row's version is still
+        the one the job dict was read with (and, with expected_task_id, the row
+        still tracks that task), so a stale writer - a poll racing a callback,
+        or a job that was already retried - can't clobber newer state. Visible
+        changes bump the batch version and stamp the job with it. Returns True
+        if the row was updated.
+        """
+        with self._transaction() as conn:
+            current = conn.execute('SELECT * FROM jobs WHERE id = ?', (job['id'],)).fetchone()
+            if current is None:
+                return False
+            if job.get('version') is not None and current['version'] != job['version']:
+                return False
+            if expected_task_id is not None and current['task_id'] != expected_task_id:
+                return False
+
+            version = current['version']
+            if any(current[field] != job.get(field) for field in JOB_FIELDS if field not in INTERNAL_FIELDS):
+                conn.execute('UPDATE batches SET version = version + 1 WHERE batch_id = ?', (current['batch_id'],))
+                version = conn.execute(
+                    'SELECT version FROM batches WHERE batch_id = ?', (current['batch_id'],)
+                ).fetchone()['version']
+
+            assignments = ', '.join(f'{field} = ?' for field in JOB_FIELDS)
+            conn.execute(
+                f'UPDATE jobs SET {assignments}, updated_at = ?, version = ? WHERE id = ?',
+                (*[job.get(field) for field in JOB_FIELDS], time.time(), version, job['id'])
+            )
+        job['version'] = version
+        return True
+
+    def due_jobs(self, now, limit=500):
+        """In-flight jobs whose next poll time has passed, with their batch's API key"""
+        placeholders = ', '.join('?' for _ in IN_FLIGHT_STATUSES)
+        rows = self._conn().execute(
+            f'SELECT jobs.*, batches.api_key AS api_key FROM jobs '
+            f'JOIN batches ON batches.batch_id = jobs.batch_id '
+            f'WHERE jobs.next_poll_at IS NOT NULL AND jobs.next_poll_at <= ? '
+            f'AND jobs.status IN ({placeholders}) AND jobs.task_id IS NOT NULL '
+            f'ORDER BY jobs.next_poll_at LIMIT ?',
+            (now, *IN_FLIGHT_STATUSES, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_cached_upload(self, cache_key):
+        """Remote URL of a previous upload with this key, if it hasn't expired"""
+        row = self._conn().execute(
+            'SELECT download_url FROM avatar_uploads WHERE cache_key = ? AND expires_at > ?',
+            (cache_key, time.time())
+        ).fetchone()
+        return row['download_url'] if row is not None else None
+
+    def cache_upload(self, cache_key, download_url, ttl):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO avatar_uploads (cache_key, download_url, expires_at) VALUES (?, ?, ?)',
+                (cache_key, download_url, time.time() + ttl)
+            )
+            # Expired rows are useless; drop them while we hold the write lock
+            conn.execute('DELETE FROM avatar_uploads WHERE expires_at <= ?', (time.time(),))
+
+    @staticmethod
+    def _in_flight(conn):
+        """Jobs holding a task slot, counted per owner (see slot_owner)"""
+        admitted = ', '.join('?' for _ in ADMITTED_STATUSES)
+        counts = {}
+        for row in conn.execute(
+            f'SELECT jobs.key_id AS key_id, batches.api_key AS api_key, COUNT(*) AS count FROM jobs '
+            f'JOIN batches ON batches.batch_id = jobs.batch_id '
+            f'WHERE jobs.status IN ({admitted}) GROUP BY jobs.key_id, batches.api_key',
+            ADMITTED_STATUSES
+        ):
+            owner = slot_owner(row['key_id'], row['api_key'])
+            counts[owner] = counts.get(owner, 0) + row['count']
+        return counts
+
+    def in_flight_by_owner(self):
+        return self._in_flight(self._conn())
+
+    def claim_pending(self, now, max_in_flight, pool_keys=(), stale_after=120, only_owner=None):
+        """Admit queued jobs up to max_in_flight per API key; returns the claimed jobs.
+
+        Claimed jobs move to 'submitting' (so they hold a slot while the caller
+        submits them) and come back with their batch's API key. Within a key,
+        batches take turns one job at a time, so a long batch can't starve a
+        short one. Jobs left waiting get their place in line as queue_position.
+
+        Batches without their own API key share the server pool: `pool_keys`
+        lists usable (key_id, cooling) pairs, and each claimed job is assigned
+        the key with the most free slots, preferring keys that aren't cooling
+        down after a 429.
+
+        With only_owner (see batch_owner), only that owner's jobs are admitted
+        and re-ranked; everyone else's wait for the next full claim.
+        """
+        pending = ', '.join('?' for _ in PENDING_STATUSES)
+        with self._transaction() as conn:
+            # A worker that died mid-submit leaves jobs in 'submitting'; give them back to the queue
+            conn.execute(
+                "UPDATE jobs SET status = 'pending' WHERE status = 'submitting' AND updated_at < ?",
+                (now - stale_after,)
+            )
+            in_flight = self._in_flight(conn)
+            rows = conn.execute(
+                f'SELECT jobs.*, batches.api_key AS api_key FROM jobs '
+                f'JOIN batches ON batches.batch_id = jobs.batch_id '
+                f'WHERE jobs.status IN ({pending}) '
+                f'ORDER BY batches.created_at, jobs.batch_id, jobs.position',
+                PENDING_STATUSES
+            ).fetchall()
+
+            queues = OrderedDict()
+            claimed, changed = [], []
+            for row in rows:
+                job = dict(row)
+                # Retries wait out their backoff before rejoining the queue
+                if job['status'] == 'retrying' and (job['next_retry_at'] or 0) > now:
+                    if job['queue_position'] is not None:
+                        job['queue_position'] = None
+                        changed.append(job)
+                else:
+                    owner = batch_owner(job['api_key'])
+                    if only_owner is None or owner == only_owner:
+                        queues.setdefault(owner, OrderedDict()).setdefault(job['batch_id'], []).append(job)
+
+            pool_room = {key_id: max(0, max_in_flight - in_flight.get(key_id, 0)) for key_id, _ in pool_keys}
+            cooling = {key_id for key_id, is_cooling in pool_keys if is_cooling}
+            for owner, batches in queues.items():
+                if owner == POOL_OWNER and not pool_room:
+                    # No pool key is usable (all disabled, or none configured any more): tell the
+                    # user instead of leaving the jobs queued with nothing to run them
+                    for job in _round_robin(batches):
+                        job['status'] = 'failed'
+                        job['error'] = POOL_UNAVAILABLE_ERROR
+                        job['queue_position'] = None
+                        changed.append(job)
+                    continue
+                if owner == POOL_OWNER:
+                    room = sum(pool_room.values())
+                else:
+                    room = max(0, max_in_flight - in_flight.get(owner, 0))
+                for rank, job in enumerate(_round_robin(batches)):
+                    if rank < room:
+                        if owner == POOL_OWNER:
+                            key_id = max(pool_room, key=lambda k: (pool_room[k] > 0, k not in cooling, pool_room[k]))
+                            pool_room[key_id] -= 1
+                            job['key_id'] = key_id
+                        job['status'] = 'submitting'
+                        job['queue_position'] = None
+                        claimed.append(job)
+                        changed.append(job)
+                    elif job['queue_position'] != rank - room + 1:
+                        job['queue_position'] = rank - room + 1
+                        changed.append(job)
+
+            versions = {}
+            for job in changed:
+                if job['batch_id'] not in versions:
+                    conn.execute('UPDATE batches SET version = version + 1 WHERE batch_id = ?', (job['batch_id'],))
+                    versions[job['batch_id']] = conn.execute(
+                        'SELECT version FROM batches WHERE batch_id = ?', (job['batch_id'],)
+                    ).fetchone()['version']
+                job['version'] = versions[job['batch_id']]
+                conn.execute(
+                    'UPDATE jobs SET status = ?, error = ?, queue_position = ?, key_id = ?, updated_at = ?, '
+                    'version = ? WHERE id = ?',
+                    (job['status'], job['error'], job['queue_position'], job['key_id'], now, job['version'],
+                     job['id'])
+                )
+        return claimed
+
+    def avatar_hash(self, download_url):
+        """Content hash of an uploaded avatar, if the upload is still in the cache"""
+        row = self._conn().execute(
+            'SELECT cache_key FROM avatar_uploads WHERE download_url = ?', (download_url,)
+        ).fetchone()
+        return row['cache_key'].rsplit(':', 1)[-1] if row is not None else None
+
+    def get_memo(self, memo_key):
+        """(task_id, video_url) of an earlier identical generation, if it hasn't expired"""
+        row = self._conn().execute(
+            'SELECT task_id, video_url FROM memo WHERE memo_key = ? AND expires_at > ?',
+            (memo_key, time.time())
+        ).fetchone()
+        return (row['task_id'], row['video_url']) if row is not None else None
+
+    def remember(self, memo_key, task_id, video_url, ttl):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO memo (memo_key, task_id, video_url, expires_at) VALUES (?, ?, ?, ?)',
+                (memo_key, task_id, video_url, time.time() + ttl)
+            )
+            conn.execute('DELETE FROM memo WHERE expires_at <= ?', (time.time(),))
+
+    def create_transcript_job(self, job_id, url, video_key, status='queued', **fields):
+        now = time.time()
+        values = {'transcript': None, 'method': None, 'metadata': None, 'error': None, **fields}
+        if isinstance(values['metadata'], dict):
+            values['metadata'] = json.dumps(values['metadata'])
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO transcript_jobs (id, url, video_key, status, transcript, method, metadata, error, '
+                'created_at, updated_at, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, url, video_key, status, values['transcript'], values['method'],
+                 values['metadata'], values['error'], now, now, now)
+            )
+            # Results are only fetched right after they finish; don't keep them around
+            conn.execute(
+                "DELETE FROM transcript_jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (now - 86400,)
+            )
+        return self.get_transcript_job(job_id)
+
+    def get_transcript_job(self, job_id):
+        row = self._conn().execute('SELECT * FROM transcript_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['metadata'] = json.loads(job['metadata']) if job['metadata'] else {}
+        return job
+
+    def find_active_transcript_job(self, video_key, stale_after, heartbeat_timeout):
+        """A queued/running extraction of the same video that's still making progress.
+
+        Jobs not updated for stale_after seconds are hung, and jobs whose worker
+        hasn't sent a heartbeat for heartbeat_timeout seconds died with it.
+        """
+        now = time.time()
+        row = self._conn().execute(
+            f"SELECT id FROM transcript_jobs WHERE video_key = ? AND {ACTIVE_TRANSCRIPT_JOB} "
+            'ORDER BY created_at DESC LIMIT 1',
+            (video_key, now - stale_after, now - heartbeat_timeout)
+        ).fetchone()
+        return self.get_transcript_job(row['id']) if row is not None else None
+
+    def count_active_transcript_jobs(self, stale_after, heartbeat_timeout):
+        now = time.time()
+        return self._conn().execute(
+            f'SELECT COUNT(*) AS count FROM transcript_jobs WHERE {ACTIVE_TRANSCRIPT_JOB}',
+            (now - stale_after, now - heartbeat_timeout)
+        ).fetchone()['count']
+
+    def heartbeat_transcript_jobs(self, job_ids):
+        """Mark queued/running transcript jobs as still owned by a live worker"""
+        if not job_ids:
+            return
+        placeholders = ', '.join('?' for _ in job_ids)
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE transcript_jobs SET heartbeat_at = ? WHERE id IN ({placeholders}) "
+                "AND status IN ('queued', 'running')",
+                (time.time(), *job_ids)
+            )
+
+    def update_transcript_job(self, job_id, **fields):
+        if isinstance(fields.get('metadata'), dict):
+            fields['metadata'] = json.dumps(fields['metadata'])
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        with self._transaction() as conn:
+            conn.execute(
+                f'UPDATE transcript_jobs SET {assignments}, updated_at = ? WHERE id = ?',
+                (*fields.values(), time.time(), job_id)
+            )
+
+    def key_states(self, key_ids):
+        """Shared health of pool keys: {key_id: {disabled_until, disabled_reason, rate_limited_at}}"""
+        if not key_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in key_ids)
+        rows = self._conn().execute(
+            f'SELECT * FROM api_keys WHERE key_id IN ({placeholders})', list(key_ids)
+        ).fetchall()
+        return {row['key_id']: dict(row) for row in rows}
+
+    def set_key_state(self, key_id, **fields):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO api_keys (key_id) VALUES (?)', (key_id,))
+            assignments = ', '.join(f'{field} = ?' for field in fields)
+            conn.execute(f'UPDATE api_keys SET {assignments} WHERE key_id = ?', (*fields.values(), key_id))
+
+    def import_json_batches(self, folder):
+        """Import legacy batch_<id>.json files; batches already in the store are skipped"""
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(folder, 'batch_*.json'))):
+            batch_id = os.path.basename(path)[len('batch_'):-len('.json')]
+            try:
+                with open(path, 'r') as f:
+                    batch_data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable batch file {path}: {e}")
+                continue
+
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO batches (batch_id, api_key, created_at, version) VALUES (?, ?, ?, 1)',
+                    (batch_id, batch_data.get('api_key'), os.path.getmtime(path))
+                )
+                if cursor.rowcount == 0:
+                    continue
+                jobs = batch_data.get('jobs', [])
+                for job in jobs:
+                    # Old files predate scheduling fields; poll in-flight jobs right away
+                    if job.get('status') in IN_FLIGHT_STATUSES and job.get('task_id'):
+                        job.setdefault('next_poll_at', time.time())
+                self._insert_jobs(conn, batch_id, jobs, time.time())
+                imported += 1
+        return imported
+
+
+# Slot owner of batches that draw from the server-side key pool
+POOL_OWNER = 'pool'
+POOL_UNAVAILABLE_ERROR = 'No server API key is available right now (all are disabled); try again later or use your own API key'
+
+
+def slot_owner(key_id, api_key):
+    """Whose concurrent-task slots a job uses: its pool key, or the batch's own API key"""
+    if key_id:
+        return key_id
+    return 'user:' + hashlib.sha256(api_key.encode()).hexdigest()[:12] if api_key else None
+
+
+def batch_owner(api_key):
+    """Whose queue a batch's jobs wait in: the batch's own API key, or the server pool"""
+    return slot_owner(None, api_key) if api_key else POOL_OWNER
+
+
+def _round_robin(batches):
+    """Interleave per-batch job lists: first job of each batch, then the second of each, ..."""
+    lists = [list(jobs) for jobs in batches.values()]
+    for depth in range(max((len(jobs) for jobs in lists), default=0)):
+        for jobs in lists:
+            if depth < len(jobs):
+                yield jobs[depth]
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK; takes the write lock up front to avoid upgrade deadlocks"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python job_store.py <db_path> <batch_json_folder>")
+        sys.exit(1)
+    count = JobStore(sys.argv[1]).import_json_batches(sys.argv[2])
+    print(f"✅ Imported {count} batch(es)")
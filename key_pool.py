@@ -0,0 +1,65 @@
+"""
+Kie API key pool - spreads generations over several server-side Kie accounts
+
+Keys come from the environment and are never written to the job store; jobs
+only record the key_id (a short hash) of the key that owns their task. Key
+health (disabled after auth/credit errors, cooling down after 429s) lives in
+the job store so every worker sees the same picture.
+"""
+import hashlib
+import time
+
+
+def key_id_for(api_key):
+    """Stable, non-secret identifier for a pool key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+class KeyPool:
+    """Server-side Kie API keys plus the shared health state used to choose between them"""
+
+    def __init__(self, store, keys, cooldown=60, disable_for=3600):
+        self.store = store
+        self.keys = {key_id_for(key): key for key in keys if key}
+        self.cooldown = cooldown
+        self.disable_for = disable_for
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def secret(self, key_id):
+        """The API key behind key_id, or None if it isn't (or is no longer) in the pool"""
+        return self.keys.get(key_id) if key_id else None
+
+    def candidates(self, now=None):
+        """Usable keys as [(key_id, cooling)]; cooling keys saw a 429 recently and are picked last"""
+        now = now or time.time()
+        states = self.store.key_states(list(self.keys))
+        usable = []
+        for key_id in self.keys:
+            state = states.get(key_id) or {}
+            if (state.get('disabled_until') or 0) > now:
+                continue
+            cooling = (state.get('rate_limited_at') or 0) > now - self.cooldown
+            usable.append((key_id, cooling))
+        return usable
+
+    def pick(self, max_in_flight):
+        """(key_id, api_key) with the most headroom right now, for one-off calls like uploads"""
+        in_flight = self.store.in_flight_by_owner()
+        best = None
+        for key_id, cooling in self.candidates():
+            score = (not cooling, max_in_flight - in_flight.get(key_id, 0))
+            if best is None or score > best[0]:
+                best = (score, key_id)
+        if best is None:
+            return None, None
+        return best[1], self.keys[best[1]]
+
+    def disable(self, key_id, reason):
+        """Take a key out of rotation for a while (revoked, out of credits, ...)"""
+        print(f"Disabling Kie key {key_id} for {self.disable_for}s: {reason}")
+        self.store.set_key_state(key_id, disabled_until=time.time() + self.disable_for, disabled_reason=reason)
+
+    def mark_rate_limited(self, key_id):
+        self.store.set_key_state(key_id, rate_limited_at=time.time())
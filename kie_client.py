@@ -0,0 +1,224 @@
+"""
+Kie AI HTTP client - one pooled, keep-alive session shared by all upstream calls
+"""
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Veo model used for every generation, and the default (vertical) output format
+VEO_MODEL = 'veo3_fast'
+DEFAULT_ASPECT_RATIO = '9:16'
+
+
+class KieClient:
+    """Thin wrapper around the Kie AI API backed by a pooled requests.Session.
+
+    The session is thread-safe for our usage (independent requests with
+    per-call headers), so a single instance is shared by every request
+    handler and background thread in the worker process. With a `limiter`
+    (see rate_limiter.py), API calls wait for their budget before going out.
+    """
+
+    def __init__(self, api_base="https://api.kie.ai/api/v1",
+                 upload_base="https://kieai.redpandaai.co",
+                 pool_size=32, connect_timeout=5, read_timeout=30,
+                 download_timeout=120, limiter=None):
+        self.api_base = api_base.rstrip('/')
+        self.upload_base = upload_base.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.download_timeout = (connect_timeout, download_timeout)
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        # One pool per host; pool_maxsize bounds keep-alive connections per host
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _wait_for(self, budget, api_key):
+        """Wait for a rate-limit token; False if the limiter gave up"""
+        return self.limiter is None or self.limiter.acquire(budget, api_key)
+
+    def _rate_limited(self, budget, api_key, code):
+        """Upstream said 429 despite our budget - make every worker back off"""
+        if code == 429 and self.limiter is not None:
+            self.limiter.drain(budget, api_key)
+
+    def upload_image(self, api_key, file, filename='avatar.jpg', content_type='image/jpeg'):
+        """Upload image (bytes or file object) to Kie AI and return URL"""
+        url = f"{self.upload_base}/api/file-stream-upload"
+        headers = {'Authorization': f'Bearer {api_key}'}
+
+        if not self._wait_for('upload', api_key):
+            print("Upload error: rate limit wait exceeded")
+            return None
+
+        try:
+            files = {'file': (filename, file, content_type)}
+            data = {'uploadPath': 'avatars'}
+            response = self.session.post(url, headers=headers, files=files, data=data,
+                                         timeout=self.timeout)
+            self._rate_limited('upload', api_key, response.status_code)
+            response.raise_for_status()
+            result = response.json()
+
+            if result.get('success') and result.get('code') == 200:
+                return result.get('data', {}).get('downloadUrl')
+            else:
+                print(f"Upload error: {result.get('msg')}")
+                return None
+        except Exception as e:
+            print(f"Upload exception: {e}")
+            return None
+
+    def generate_video(self, api_key, prompt, image_url=None, aspect_ratio=DEFAULT_ASPECT_RATIO, callback_url=None):
+        """Generate video via Kie AI API"""
+        url = f"{self.api_base}/veo/generate"
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        data = {
+            'prompt': prompt,
+            'model': VEO_MODEL,
+            'aspect_ratio': aspect_ratio,
+            'enableTranslation': True
+        }
+
+        if image_url:
+            data['imageUrls'] = [image_url]
+            data['generationType'] = 'FIRST_AND_LAST_FRAMES_2_VIDEO'
+        else:
+            data['generationType'] = 'TEXT_2_VIDEO'
+
+        if callback_url:
+            data['callBackUrl'] = callback_url
+
+        if not self._wait_for('submit', api_key):
+            return {'success': False, 'error': 'Rate limit wait exceeded', 'code': 429}
+
+        try:
+            response = self.session.post(url, headers=headers, json=data, timeout=self.timeout)
+            self._rate_limited('submit', api_key, response.status_code)
+            response.raise_for_status()
+            result = response.json()
+
+            if result.get('code') == 200:
+                return {'success': True, 'task_id': result.get('data', {}).get('taskId')}
+            else:
+                self._rate_limited('submit', api_key, result.get('code'))
+                error_msg = result.get('msg', 'Unknown error')
+                return {'success': False, 'error': error_msg, 'code': result.get('code')}
+        except requests.exceptions.HTTPError as e:
+            # Handle HTTP errors (400, 500, etc.)
+            try:
+                error_data = e.response.json()
+                error_msg = error_data.get('msg', str(e))
+            except:
+                error_msg = str(e)
+            return {'success': False, 'error': f"HTTP {e.response.status_code}: {error_msg}",
+                    'code': e.response.status_code}
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'code': None}
+
+    def check_status(self, api_key, task_id):
+        """Check generation status.
+
+        'failed' means the render itself failed; 'error' means the status
+        lookup failed (network, rate limit, ...) and says nothing about the task.
+        """
+        url = f"{self.api_base}/veo/record-info"
+        headers = {'Authorization': f'Bearer {api_key}'}
+        params = {'taskId': task_id}
+
+        if not self._wait_for('status', api_key):
+            return {'status': 'error', 'error': 'Rate limit wait exceeded', 'code': 429}
+
+        try:
+            response = self.session.get(url, headers=headers, params=params, timeout=self.timeout)
+            self._rate_limited('status', api_key, response.status_code)
+            response.raise_for_status()
+            result = response.json()
+
+            if result.get('code') == 200:
+                data = result.get('data', {})
+                success_flag = data.get('successFlag')
+
+                # Map successFlag to status
+                status_map = {
+                    0: 'generating',
+                    1: 'completed',
+                    2: 'failed',
+                    3: 'failed'
+                }
+
+                video_url = None
+                error_msg = None
+
+                if success_flag == 1 and data.get('response'):
+                    response_data = data['response']
+                    if response_data.get('resultUrls'):
+                        video_url = response_data['resultUrls'][0]
+
+                if success_flag in [2, 3]:
+                    error_msg = data.get('errorMessage', 'Generation failed')
+
+                return {
+                    'status': status_map.get(success_flag, 'unknown'),
+                    'video_url': video_url,
+                    'error': error_msg,
+                    'code': data.get('errorCode')
+                }
+            else:
+                self._rate_limited('status', api_key, result.get('code'))
+                return {'status': 'error', 'error': result.get('msg'), 'code': result.get('code')}
+        except requests.exceptions.HTTPError as e:
+            return {'status': 'error', 'error': str(e), 'code': e.response.status_code}
+        except Exception as e:
+            return {'status': 'error', 'error': str(e), 'code': None}
+
+    def open_video(self, video_url, offset=0):
+        """Start streaming a generated video (from `offset` bytes); caller iterates and closes the response"""
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        response = self.session.get(video_url, headers=headers, stream=True, timeout=self.download_timeout)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    @staticmethod
+    def parse_callback(payload):
+        """Convert a Kie generation callback body into (task_id, check_status-style result).
+
+        Raises ValueError if the body isn't shaped like a callback (it comes from the open internet).
+        """
+        if not isinstance(payload, dict):
+            raise ValueError('Callback body is not a JSON object')
+        data = payload.get('data') or {}
+        if not isinstance(data, dict):
+            raise ValueError('Callback data is not a JSON object')
+        info = data.get('info') or {}
+        if not isinstance(info, dict):
+            raise ValueError('Callback info is not a JSON object')
+        task_id = data.get('taskId')
+        if not isinstance(task_id, str):
+            task_id = None
+
+        if payload.get('code') == 200:
+            result_urls = info.get('resultUrls') or []
+            if isinstance(result_urls, str):
+                # Some callback versions send the list JSON-encoded
+                try:
+                    result_urls = json.loads(result_urls)
+                except ValueError:
+                    result_urls = [result_urls]
+            if not isinstance(result_urls, list) or not all(isinstance(url, str) for url in result_urls):
+                raise ValueError('Callback resultUrls is not a list of URLs')
+            video_url = result_urls[0] if result_urls else None
+            return task_id, {'status': 'completed', 'video_url': video_url, 'error': None}
+
+        return task_id, {'status': 'failed', 'video_url': None, 'error': payload.get('msg') or 'Generation failed'}
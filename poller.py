@@ -0,0 +1,100 @@
+"""
+Background status poller - one leader per host polls Kie AI for all in-flight jobs
+"""
+import os
+import threading
+import time
+import traceback
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+# Veo renders take ~60-90s, so the first check waits until a result is plausible,
+# polls quickly through the expected completion window, then backs off.
+FIRST_POLL_AFTER = 40
+POLL_SCHEDULE = [
+    (120, 5),    # up to 2 min old: every 5s
+    (300, 10),   # up to 5 min old: every 10s
+    (None, 30),  # anything older: every 30s
+]
+
+
+# When Kie reports completion via callback, polling is only a slow safety sweep
+# for callbacks that never arrive.
+FALLBACK_POLL_AFTER = 180
+FALLBACK_POLL_INTERVAL = 60
+
+
+def next_poll_delay(age, fallback=False):
+    """Seconds to wait before polling a task that was submitted `age` seconds ago"""
+    if fallback:
+        return max(FALLBACK_POLL_AFTER - age, FALLBACK_POLL_INTERVAL)
+    if age < FIRST_POLL_AFTER:
+        return FIRST_POLL_AFTER - age
+    for max_age, interval in POLL_SCHEDULE:
+        if max_age is None or age < max_age:
+            return interval
+    return POLL_SCHEDULE[-1][1]
+
+
+class BackgroundPoller:
+    """Runs `tick()` on a daemon thread in whichever process holds the lock file.
+
+    Every gunicorn worker starts a poller, but only the one holding an
+    exclusive flock on `lock_path` actually polls; the others retry the lock
+    periodically and take over if the leader's process exits.
+    """
+
+    def __init__(self, tick, lock_path, interval=2.0, lock_retry=15.0):
+        self.tick = tick
+        self.lock_path = lock_path
+        self.interval = interval
+        self.lock_retry = lock_retry
+        self.is_leader = False
+        self._lock_file = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the poller thread once per process (safe to call repeatedly)"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='status-poller', daemon=True)
+            self._thread.start()
+
+    def _try_acquire(self):
+        if not HAS_FCNTL:
+            # No advisory locks on this platform - assume a single process
+            return True
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Keep the file open for the life of the process to hold the lock
+        self._lock_file = lock_file
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        return True
+
+    def _run(self):
+        while True:
+            if not self.is_leader:
+                self.is_leader = self._try_acquire()
+                if not self.is_leader:
+                    time.sleep(self.lock_retry)
+                    continue
+                print(f"Status poller active in pid {os.getpid()}")
+
+            try:
+                self.tick()
+            except Exception:
+                traceback.print_exc()
+            time.sleep(self.interval)
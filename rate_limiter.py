@@ -0,0 +1,108 @@
+"""
+Rate limiter - token buckets in SQLite, shared by every thread and gunicorn worker on the host
+
+Each bucket refills at `rate` tokens per second up to `burst`. Callers that
+find a bucket empty sleep until a token is due instead of sending a request
+that Kie would reject with a 429.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Kie allows ~20 new generations per 10s per account; status and upload calls are cheaper
+DEFAULT_BUDGETS = {
+    'submit': (2.0, 20),
+    'status': (10.0, 20),
+    'upload': (2.0, 10),
+}
+
+# Longest single sleep, so waiters re-check a bucket that was topped up or drained meanwhile
+MAX_SLEEP = 1.0
+
+
+class RateLimiter:
+    """Cross-process token buckets, one per (budget, API key)"""
+
+    def __init__(self, db_path, budgets=None, max_wait=60.0):
+        self.db_path = db_path
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.max_wait = max_wait
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _bucket_name(budget, api_key):
+        # Kie limits per account; never store the key itself
+        return f"{budget}:{hashlib.sha256((api_key or '').encode()).hexdigest()[:16]}"
+
+    def _take(self, name, rate, burst, now):
+        """Take one token if available; returns 0 on success, else seconds until one is due"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                tokens = float(burst)
+            else:
+                tokens = min(float(burst), row['tokens'] + max(0.0, now - row['updated_at']) * rate)
+
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)',
+                (name, tokens, now)
+            )
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return wait
+
+    def acquire(self, budget, api_key):
+        """Block until a `budget` token is available for api_key; False if max_wait ran out first"""
+        if budget not in self.budgets:
+            return True
+        rate, burst = self.budgets[budget]
+        if rate <= 0:
+            # A zero rate disables limiting for this budget
+            return True
+
+        name = self._bucket_name(budget, api_key)
+        deadline = time.time() + self.max_wait
+        while True:
+            now = time.time()
+            wait = self._take(name, rate, burst, now)
+            if not wait:
+                return True
+            if now + wait > deadline:
+                return False
+            time.sleep(min(wait, MAX_SLEEP))
+
+    def drain(self, budget, api_key):
+        """Empty a bucket after upstream answered 429, so every worker backs off together"""
+        self._conn().execute(
+            'INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, 0, ?)',
+            (self._bucket_name(budget, api_key), time.time())
+        )
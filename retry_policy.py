@@ -0,0 +1,83 @@
+"""
+Retry policy - decides whether a failed generation is worth resubmitting, and when
+"""
+import random
+
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+
+# Deterministic failures: resubmitting the same prompt/image fails the same way
+PERMANENT_ERROR_MARKERS = (
+    'public_error_prominent_people_filter_failed',
+    'public_error_violence_filter_failed',
+    'public_error_nsfw_filter_failed',
+    'public_error_copyrighted_material',
+    'public_error_prompt_too_long',
+    'public_error_invalid_image',
+    'insufficient credits',
+    'insufficient balance',
+    'unauthorized',
+    'invalid api key',
+)
+
+TRANSIENT_ERROR_MARKERS = (
+    'timeout',
+    'timed out',
+    'connection',
+    'temporarily',
+    'rate limit',
+    'too many requests',
+    'service unavailable',
+    'internal error',
+    'server error',
+)
+
+# Upstream codes (HTTP status or the `code` field in Kie's JSON body)
+PERMANENT_CODES = {400, 401, 402, 403, 404, 413, 422}
+TRANSIENT_CODES = {408, 425, 429, 455, 500, 501, 502, 503, 504, 505}
+
+# Errors that say the API key itself is unusable (revoked, out of credits)
+KEY_ERROR_MARKERS = (
+    'insufficient credits',
+    'insufficient balance',
+    'unauthorized',
+    'invalid api key',
+)
+KEY_ERROR_CODES = {401, 402}
+
+# Exponential backoff: base * 2^attempt seconds, capped, with jitter
+BACKOFF_BASE = 20
+BACKOFF_CAP = 600
+
+
+def classify_error(error, code=None):
+    """Return PERMANENT or TRANSIENT for an upstream error message and optional code"""
+    text = (error or '').lower()
+
+    # Content-filter style errors win over the code - Kie reports some of them as 500
+    if any(marker in text for marker in PERMANENT_ERROR_MARKERS):
+        return PERMANENT
+    if code in TRANSIENT_CODES or any(marker in text for marker in TRANSIENT_ERROR_MARKERS):
+        return TRANSIENT
+    if code in PERMANENT_CODES:
+        return PERMANENT
+
+    # Unexplained generation failures are usually flaky renders - worth another try
+    return TRANSIENT
+
+
+def is_key_error(error, code=None):
+    """True if the error is about the API key (auth or credits) rather than the request"""
+    text = (error or '').lower()
+    return code in KEY_ERROR_CODES or any(marker in text for marker in KEY_ERROR_MARKERS)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Seconds to wait before retry number `attempt` (0-based), with equal jitter.
+
+    Half of the exponential delay is fixed and half is random, so retries of
+    jobs that failed together (e.g. a burst of 429s) spread out instead of
+    hitting the API again in lockstep.
+    """
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,67 @@
+"""
+Script parser - split a formatted script into labelled segments in one pass
+
+A script is a series of blocks:
+
+    HOOK
+    <prompt text, any number of lines>
+
+    Backend 1 — HOLDING PRODUCT
+    <prompt text>
+
+A label line starts with a capital letter and holds only letters, digits and
+spaces, optionally followed by a dash and HOLDING PRODUCT. The first
+non-blank line after a label always belongs to its prompt, and a label on the
+very last line (no newline after it) is prompt text too - the same rules the
+old regex parser applied, without its backtracking on long scripts.
+"""
+import re
+
+LABEL = re.compile(r'[A-Z][A-Za-z0-9 \t]*')
+HOLDING_MARKER = 'HOLDING PRODUCT'
+# Em dash, en dash or ASCII hyphen(s) before HOLDING PRODUCT
+MARKER_DASHES = ('—', '–', '--', '-')
+NEWLINES = re.compile(r'\r\n?')
+
+
+def parse_label(line):
+    """(label, holding_product) if line is a label line, else None"""
+    text = line.rstrip()
+    holding_product = False
+    if text.endswith(HOLDING_MARKER):
+        head = text[:-len(HOLDING_MARKER)].rstrip()
+        for dash in MARKER_DASHES:
+            if head.endswith(dash):
+                text = head[:-len(dash)].rstrip()
+                holding_product = True
+                break
+    if not LABEL.fullmatch(text):
+        return None
+    return text, holding_product
+
+
+def parse_script(script_text):
+    """Parse formatted script into segments - matches ANY label"""
+    lines = NEWLINES.sub('\n', script_text).split('\n')
+    segments = []
+    current = None
+    prompt_lines = []
+
+    for index, line in enumerate(lines):
+        # A label needs a following line; the first prompt line can't be a label
+        label = None
+        if index < len(lines) - 1 and (current is None or prompt_lines):
+            label = parse_label(line)
+        if label:
+            if current is not None:
+                current['prompt'] = '\n'.join(prompt_lines).strip()
+                segments.append(current)
+            current = {'label': label[0], 'prompt': '', 'holding_product': label[1]}
+            prompt_lines = []
+        elif current is not None and (prompt_lines or line.strip()):
+            prompt_lines.append(line)
+
+    if current is not None:
+        current['prompt'] = '\n'.join(prompt_lines).strip()
+        segments.append(current)
+    return segments
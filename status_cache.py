@@ -0,0 +1,83 @@
+"""
+Status cache - single-flight coalescing and a short TTL cache in front of check_status
+
+Per process: concurrent lookups of the same task_id share one upstream
+request, recent results are reused for `ttl` seconds, and finished tasks
+(completed/failed) are cached until evicted, since their result never changes.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+FINAL_STATUSES = ('completed', 'failed')
+
+
+class _Call:
+    """One upstream lookup that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class StatusCache:
+    """Wraps a check_status(api_key, task_id) function"""
+
+    def __init__(self, fetch, ttl=3.0, max_entries=10000):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # task_id -> (fetched_at, result), least recently used first
+        self._calls = {}               # task_id -> _Call in progress
+        self._stats = {'lookups': 0, 'upstream_calls': 0, 'cache_hits': 0, 'coalesced': 0}
+
+    def check_status(self, api_key, task_id, max_age=None):
+        """check_status-style result for task_id, at most max_age (default ttl) seconds old"""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            self._stats['lookups'] += 1
+            entry = self._results.get(task_id)
+            if entry is not None:
+                fetched_at, result = entry
+                if result.get('status') in FINAL_STATUSES or time.time() - fetched_at <= max_age:
+                    self._results.move_to_end(task_id)
+                    self._stats['cache_hits'] += 1
+                    return dict(result)
+
+            call = self._calls.get(task_id)
+            leader = call is None
+            if leader:
+                call = self._calls[task_id] = _Call()
+                self._stats['upstream_calls'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            return dict(call.result)
+
+        try:
+            result = self.fetch(api_key, task_id)
+        except Exception as e:
+            result = {'status': 'error', 'error': str(e), 'code': None}
+
+        with self._lock:
+            del self._calls[task_id]
+            # Failed lookups say nothing about the task, so the next caller tries again
+            if result.get('status') != 'error':
+                self._results[task_id] = (time.time(), result)
+                self._results.move_to_end(task_id)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        call.result = result
+        call.done.set()
+        return dict(result)
+
+    def stats(self):
+        """Counters since this process started; `saved` is upstream calls avoided"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_tasks'] = len(self._results)
+        stats['saved'] = stats['cache_hits'] + stats['coalesced']
+        return stats
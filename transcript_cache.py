@@ -0,0 +1,143 @@
+"""
+Transcript cache - extracted transcripts in SQLite, keyed by the canonical video they came from
+
+The same TikTok/Short/Reel is often pasted several times (with different
+tracking parameters, short links, mobile hosts ...), and every extraction
+costs a yt-dlp run and possibly a paid Whisper call. Entries expire after a
+TTL and the least recently used ones are evicted to keep the cache under a
+size limit.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    cache_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    transcript TEXT NOT NULL,
+    method TEXT NOT NULL,
+    metadata TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcripts_last_used ON transcripts(last_used);
+CREATE INDEX IF NOT EXISTS idx_transcripts_created ON transcripts(created_at);
+"""
+
+# Video IDs for the platforms the formatter supports
+VIDEO_ID_PATTERNS = (
+    ('youtube', re.compile(r'(?:^|\.)youtube\.com$'), re.compile(r'^/(?:shorts|embed|live|v)/([\w-]{11})')),
+    ('youtube', re.compile(r'^youtu\.be$'), re.compile(r'^/([\w-]{11})')),
+    ('tiktok', re.compile(r'(?:^|\.)tiktok\.com$'), re.compile(r'/(?:video|photo)/(\d+)')),
+    ('instagram', re.compile(r'(?:^|\.)instagram\.com$'), re.compile(r'^/(?:[\w.]+/)?(?:reels?|p|tv)/([\w-]+)')),
+)
+
+# Query parameters that never change which video a URL points to
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|si|feature|fbclid|gclid|igsh|igshid|is_from_webapp|sender_device|'
+                             r'_r|_t|lang|share_\w+|t)$')
+
+
+def canonical_video_key(url):
+    """Stable cache key for a video URL: '<platform>:<id>' when recognisable, else a normalised URL"""
+    parsed = urlparse(url.strip())
+    if not parsed.scheme:
+        parsed = urlparse('https://' + url.strip())
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+
+    if host.endswith('youtube.com') and parsed.path == '/watch':
+        video_id = parse_qs(parsed.query).get('v', [''])[0]
+        if video_id:
+            return f'youtube:{video_id}'
+    for platform, host_pattern, path_pattern in VIDEO_ID_PATTERNS:
+        if host_pattern.search(host):
+            match = path_pattern.search(parsed.path)
+            if match:
+                return f'{platform}:{match.group(1)}'
+
+    # Unknown site or short link: drop tracking noise so trivially different URLs still match
+    query = sorted((key, value) for key, values in parse_qs(parsed.query).items()
+                   for value in values if not TRACKING_PARAMS.match(key))
+    path = parsed.path.rstrip('/') or '/'
+    return f"url:{host}{path}" + (f'?{urlencode(query)}' if query else '')
+
+
+class TranscriptCache:
+    """Persistent, size-bounded LRU cache of successful transcript extractions"""
+
+    def __init__(self, db_path, ttl=30 * 86400, max_bytes=50 * 1024 * 1024):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def get(self, url):
+        """Cached {'transcript', 'method', 'metadata'} for url, or None"""
+        key = canonical_video_key(url)
+        now = time.time()
+        row = self._conn().execute(
+            'SELECT transcript, method, metadata FROM transcripts WHERE cache_key = ? AND created_at > ?',
+            (key, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn().execute('UPDATE transcripts SET last_used = ? WHERE cache_key = ?', (now, key))
+        return {
+            'transcript': row['transcript'],
+            'method': row['method'],
+            'metadata': json.loads(row['metadata']) if row['metadata'] else {},
+        }
+
+    def put(self, url, transcript, method, metadata=None):
+        """Cache a transcript under the URL's key and, if known, the extractor's own video ID.
+
+        Short links (vm.tiktok.com/...) can't be resolved without a request,
+        so after extracting one, the video's regular URL still gets a hit.
+        """
+        now = time.time()
+        metadata = metadata or {}
+        metadata_json = json.dumps(metadata)
+        size = len(transcript.encode('utf-8')) + len(metadata_json)
+        keys = {canonical_video_key(url)}
+        if metadata.get('extractor') and metadata.get('id'):
+            keys.add(f"{metadata['extractor'].lower()}:{metadata['id']}")
+        for key in keys:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO transcripts '
+                '(cache_key, url, transcript, method, metadata, size, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, transcript, method, metadata_json, size, now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes"""
+        conn = self._conn()
+        conn.execute('DELETE FROM transcripts WHERE created_at <= ?', (time.time() - self.ttl,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) AS total FROM transcripts').fetchone()['total']
+        if total <= self.max_bytes:
+            return
+        for row in conn.execute('SELECT cache_key, size FROM transcripts ORDER BY last_used').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM transcripts WHERE cache_key = ?', (row['cache_key'],))
+            total -= row['size']
@@ -0,0 +1,175 @@
+"""
+Transcript extraction - captions via yt-dlp, falling back to Whisper on the audio
+
+One yt-dlp info extraction per URL decides what's available; captions are
+then fetched directly and audio is downloaded from the same info dict, so the
+no-captions path never runs the extractor twice.
+
+Strategies:
+    hedged           - when captions are missing or only auto-generated (often
+                       empty or junk on TikTok/Reels), start the audio download
+                       alongside the caption fetch. Usable captions cancel the
+                       download before Whisper is ever called; otherwise the
+                       audio is already on disk when it's needed
+    subtitles-first  - try captions, and only then download the audio (never
+                       downloads audio that turns out to be unnecessary)
+
+Audio goes through audio_pipeline.Transcriber, which shrinks it, splits long
+videos at silences and transcribes the pieces in parallel.
+"""
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_pipeline import Transcriber
+from vtt_parser import parse_vtt_lines
+
+try:
+    import yt_dlp
+    HAS_YTDLP = True
+except ImportError:
+    HAS_YTDLP = False
+
+try:
+    import openai
+    HAS_OPENAI = True
+except ImportError:
+    HAS_OPENAI = False
+
+STRATEGIES = ('hedged', 'subtitles-first')
+SUBTITLE_LANGS = ['en', 'en-US', 'en-GB', 'en-orig']
+# Shorter "transcripts" are caption noise (music notes, [Applause], ...)
+MIN_TRANSCRIPT_CHARS = 20
+
+NO_CAPTIONS_ERROR = 'No captions found on this video. Enter an OpenAI API key to transcribe the audio with Whisper AI.'
+
+
+class ExtractionCancelled(Exception):
+    """Raised inside a yt-dlp download once the other branch of a hedged extraction won"""
+
+
+def video_metadata(info):
+    """The parts of a yt-dlp info dict worth keeping next to a transcript"""
+    return {
+        'id': info.get('id'),
+        'extractor': info.get('extractor_key'),
+        'title': info.get('title'),
+        'uploader': info.get('uploader'),
+        'duration': info.get('duration'),
+        'webpage_url': info.get('webpage_url'),
+    }
+
+
+def pick_captions(info):
+    """Best English VTT track in an info dict as (track, automatic), or (None, None)"""
+    for key, automatic in (('subtitles', False), ('automatic_captions', True)):
+        tracks = info.get(key) or {}
+        for lang in SUBTITLE_LANGS:
+            for track in tracks.get(lang) or []:
+                if track.get('ext') == 'vtt' and track.get('url'):
+                    return track, automatic
+    return None, None
+
+
+def fetch_captions(ydl, track, automatic):
+    """Download a caption track (with yt-dlp's headers/cookies) and parse it; None if unusable.
+
+    Only auto-generated tracks roll (repeat the previous line), so only theirs get the overlap removed.
+    """
+    try:
+        with ydl.urlopen(track['url']) as response:
+            # Parsed as it streams in - multi-hour caption files never sit in memory whole
+            transcript = parse_vtt_lines(io.TextIOWrapper(response, encoding='utf-8', errors='replace'),
+                                         rolling=automatic)
+    except Exception as e:
+        print(f"Subtitle extraction error: {e}")
+        return None
+    return transcript if len(transcript.strip()) > MIN_TRANSCRIPT_CHARS else None
+
+
+def download_audio(info, tmpdir, cancel=None):
+    """Download the audio of an already-extracted video as-is; returns the file path.
+
+    No MP3 re-encode here - the audio pipeline converts it straight to the
+    small speech format Whisper gets.
+    """
+    def check_cancel(progress):
+        if cancel is not None and cancel.is_set():
+            raise ExtractionCancelled()
+
+    audio_opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.join(tmpdir, 'audio.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,
+        'progress_hooks': [check_cancel],
+    }
+    with yt_dlp.YoutubeDL(audio_opts) as ydl:
+        # Reuses the extracted info - no second extractor run
+        ydl.process_ie_result(dict(info), download=True)
+
+    audio_files = [name for name in os.listdir(tmpdir)
+                   if name.startswith('audio.') and not name.endswith('.part')]
+    return os.path.join(tmpdir, audio_files[0]) if audio_files else None
+
+
+def extract_transcript_from_url(url, openai_api_key=None, strategy='hedged', transcriber=None):
+    """Extract transcript from a video URL (TikTok, YouTube Shorts, Instagram Reels)"""
+    transcriber = transcriber or Transcriber()
+    if not HAS_YTDLP:
+        return {'success': False, 'error': 'yt-dlp not installed on server'}
+
+    info_opts = {
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,
+    }
+    with yt_dlp.YoutubeDL(info_opts) as ydl:
+        try:
+            info = ydl.extract_info(url, download=False) or {}
+        except Exception as e:
+            return {'success': False, 'error': f'Could not read this video: {str(e)}'}
+        metadata = video_metadata(info)
+        track, automatic = pick_captions(info)
+
+        can_transcribe = bool(openai_api_key) and HAS_OPENAI
+        hedge = strategy == 'hedged' and can_transcribe and (track is None or automatic)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cancel = threading.Event()
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # Captions missing or auto-generated: start the audio download right away
+                audio_future = executor.submit(download_audio, info, tmpdir, cancel) if hedge else None
+
+                if track is not None:
+                    transcript = fetch_captions(ydl, track, automatic)
+                    if transcript:
+                        cancel.set()
+                        return {'success': True, 'transcript': transcript, 'method': 'subtitles',
+                                'metadata': metadata}
+
+                # Step 2: Fall back to Whisper API (needs OpenAI key + ffmpeg)
+                if not openai_api_key:
+                    return {'success': False, 'error': NO_CAPTIONS_ERROR}
+                if not HAS_OPENAI:
+                    return {'success': False, 'error': 'OpenAI package not installed on server'}
+
+                try:
+                    if audio_future is not None:
+                        audio_path = audio_future.result()
+                    else:
+                        audio_path = download_audio(info, tmpdir)
+                    if not audio_path:
+                        return {'success': False, 'error': 'Failed to download audio from this URL'}
+
+                    result = transcriber.transcribe(audio_path, openai_api_key, tmpdir)
+                except Exception as e:
+                    return {'success': False, 'error': f'Whisper transcription failed: {str(e)}'}
+
+    if result['success']:
+        result['metadata'] = metadata
+    return result
@@ -0,0 +1,202 @@
+"""
+Video cache - finished videos on local disk, keyed by task_id and stored by checksum
+
+Layout under cache_dir:
+    objects/<sha256>.mp4   content-addressed video files (identical videos stored once)
+    partial/<task_id>.part downloads in progress, resumed with HTTP Range requests
+    index.db               task_id -> sha256, size, last used (for LRU eviction)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+# Read/write buffer for video I/O
+BUFFER_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    task_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_videos_last_used ON videos(last_used);
+CREATE INDEX IF NOT EXISTS idx_videos_sha256 ON videos(sha256);
+"""
+
+
+class VideoCache:
+    """Size-bounded LRU cache of generated videos, shared by all workers on the host"""
+
+    def __init__(self, cache_dir, open_video, max_bytes=5 * 1024 ** 3, fetch_concurrency=4):
+        self.cache_dir = cache_dir
+        self.open_video = open_video
+        self.max_bytes = max_bytes
+        self.fetch_concurrency = fetch_concurrency
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.partial_dir = os.path.join(cache_dir, 'partial')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.db'), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _object_path(self, sha256):
+        return os.path.join(self.objects_dir, f'{sha256}.mp4')
+
+    def get(self, task_id):
+        """Path of the cached video for task_id, or None"""
+        row = self._conn().execute('SELECT sha256 FROM videos WHERE task_id = ?', (task_id,)).fetchone()
+        if row is None:
+            return None
+        path = self._object_path(row['sha256'])
+        if not os.path.exists(path):
+            # Evicted (or deleted) behind the index's back
+            self._conn().execute('DELETE FROM videos WHERE task_id = ?', (task_id,))
+            return None
+        self._conn().execute('UPDATE videos SET last_used = ? WHERE task_id = ?', (time.time(), task_id))
+        return path
+
+    def open(self, task_id):
+        """Open file of the cached video for task_id, or None.
+
+        An open file stays readable even if the video is evicted meanwhile, so
+        callers hold the file rather than the path.
+        """
+        path = self.get(task_id)
+        if path is None:
+            return None
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            # Evicted between the lookup and the open
+            self._conn().execute('DELETE FROM videos WHERE task_id = ?', (task_id,))
+            return None
+
+    def fetch(self, task_id, video_url):
+        """Open file of the cached video for task_id, downloading it first if needed"""
+        f = self.open(task_id)
+        if f:
+            return f
+
+        part_path = os.path.join(self.partial_dir, f'{task_id}.part')
+        # A fixed set of lock files (bucketed by task_id) so they never need cleaning up
+        bucket = hashlib.sha256(task_id.encode()).hexdigest()[:2]
+        with open(os.path.join(self.partial_dir, f'{bucket}.lock'), 'a') as lock_file:
+            # Another worker may be fetching the same task; wait for it, then reuse its result
+            if HAS_FCNTL:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            f = self.open(task_id)
+            if f:
+                return f
+            sha256, size = self._download(video_url, part_path)
+            path = self._object_path(sha256)
+            if os.path.exists(path):
+                os.remove(part_path)
+            else:
+                os.replace(part_path, path)
+            self._conn().execute(
+                'INSERT OR REPLACE INTO videos (task_id, sha256, size, last_used) VALUES (?, ?, ?, ?)',
+                (task_id, sha256, size, time.time())
+            )
+            # Opened before evicting, so this video survives even if it is the one evicted
+            f = open(path, 'rb')
+
+        self.evict()
+        return f
+
+    def _download(self, video_url, part_path):
+        """Download into part_path, resuming a previous partial download; returns (sha256, size)"""
+        digest = hashlib.sha256()
+        offset = 0
+        if os.path.exists(part_path):
+            # Re-hash what we already have so the checksum covers the whole file
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(BUFFER_SIZE), b''):
+                    digest.update(block)
+                    offset += len(block)
+
+        response = self.open_video(video_url, offset=offset)
+        try:
+            if offset and response.status_code != 206:
+                # Server ignored the Range header - start over
+                digest = hashlib.sha256()
+                offset = 0
+            with open(part_path, 'ab' if offset else 'wb', buffering=BUFFER_SIZE) as f:
+                for chunk in response.iter_content(chunk_size=BUFFER_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        offset += len(chunk)
+        finally:
+            response.close()
+        return digest.hexdigest(), offset
+
+    def fetch_many(self, items):
+        """Fetch (key, task_id, video_url) items concurrently; yields (key, file, error) as each finishes.
+
+        Keys are the caller's (e.g. job ids), so several items may share one task_id.
+        The caller closes each file; files never handed out (the caller stopped
+        early) are closed here.
+        """
+        if not items:
+            return
+        workers = max(1, min(self.fetch_concurrency, len(items)))
+        futures = {}
+        handed_out = set()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self.fetch, task_id, url): key for key, task_id, url in items}
+                for future in as_completed(futures):
+                    handed_out.add(future)
+                    try:
+                        yield futures[future], future.result(), None
+                    except Exception as e:
+                        yield futures[future], None, e
+        finally:
+            for future in futures:
+                if future not in handed_out and not future.cancelled() and future.exception() is None:
+                    future.result().close()
+
+    def evict(self):
+        """Drop least recently used videos until the cache fits in max_bytes"""
+        conn = self._conn()
+        total = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) AS total FROM (SELECT size FROM videos GROUP BY sha256)'
+        ).fetchone()['total']
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            'SELECT sha256, MAX(size) AS size, MAX(last_used) AS last_used FROM videos '
+            'GROUP BY sha256 ORDER BY last_used'
+        ).fetchall()
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM videos WHERE sha256 = ?', (row['sha256'],))
+            try:
+                # Readers holding the file open keep reading it (POSIX)
+                os.remove(self._object_path(row['sha256']))
+            except OSError:
+                # Already gone, or still open on a platform that won't remove open files
+                pass
+            total -= row['size']
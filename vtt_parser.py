@@ -0,0 +1,135 @@
+"""
+VTT parser - stream WebVTT cues into a transcript, removing rolling-caption overlap
+
+YouTube/TikTok auto-captions "roll": each cue repeats the last line of the
+previous one (plus a ~10 ms cue repeating it on its own) before adding new
+words. Instead of dropping every line seen before - which also drops a
+sentence that is really said twice - each cue is compared with the previous
+cue only, and the longest suffix of the previous cue that the new cue starts
+with is skipped. A KMP prefix function finds that overlap in time linear in
+the cue length, and the file is read a line at a time. Manually written
+tracks don't roll, so their cues are kept whole.
+"""
+import html
+import io
+import re
+
+TIMING = re.compile(r'^\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s+-->\s+((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})')
+TAG = re.compile(r'<[^>]*>')
+SKIPPED_BLOCKS = ('NOTE', 'STYLE', 'REGION')
+# A cue that only repeats the end of the previous one after a pause is a real repeat,
+# not a rolling caption (those follow on without a gap)
+REPEAT_GAP_SECONDS = 0.05
+# A partial overlap (not the whole previous cue) shorter than this is taken as coincidence:
+# "...that I" followed by "I was leaving" keeps both I's
+MIN_PARTIAL_OVERLAP = 2
+
+
+def parse_timestamp(value):
+    """'01:02:03.456' or '02:03.456' to seconds"""
+    seconds = 0.0
+    for part in value.replace(',', '.').split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def iter_cues(lines):
+    """Yield (start, end, text) for each cue in an iterable of VTT lines"""
+    start = end = None
+    text_lines = []
+    in_header = False
+    skipping = False
+
+    for number, line in enumerate(lines):
+        line = line.strip().lstrip('\ufeff')
+        if number == 0 and line.startswith('WEBVTT'):
+            in_header = True
+            continue
+        if not line:
+            if start is not None and text_lines:
+                yield start, end, ' '.join(text_lines)
+            start, text_lines = None, []
+            in_header = skipping = False
+            continue
+
+        timing = TIMING.match(line)
+        if in_header and timing:
+            in_header = False
+        if in_header or skipping:
+            continue
+
+        if '-->' in line:
+            if start is not None and text_lines:
+                yield start, end, ' '.join(text_lines)
+            text_lines = []
+            # Cue settings after the end time (align:start position:0% ...) are ignored; a cue
+            # with an unreadable timing line is dropped rather than merged into the previous one
+            if timing:
+                start, end = parse_timestamp(timing.group(1)), parse_timestamp(timing.group(2))
+            else:
+                start = None
+        elif start is not None:
+            # Remove tags (<c>, <b>, inline <00:00:01.000> word timings) and entities
+            clean = html.unescape(TAG.sub('', line)).strip()
+            if clean:
+                text_lines.append(clean)
+        elif line.split(' ', 1)[0] in SKIPPED_BLOCKS:
+            skipping = True
+        # Anything else outside a cue is a cue identifier
+
+    if start is not None and text_lines:
+        yield start, end, ' '.join(text_lines)
+
+
+def overlap(previous, current):
+    """Length of the longest suffix of `previous` that is a prefix of `current` (lists of words)"""
+    if not previous or not current:
+        return 0
+    # Rolling captions: the whole previous cue (its last line) starts the new one
+    if len(previous) <= len(current) and current[:len(previous)] == previous:
+        return len(previous)
+    # Prefix function over current + separator + the end of previous
+    sequence = current + [None] + previous[-len(current):]
+    prefix = [0] * len(sequence)
+    for i in range(1, len(sequence)):
+        k = prefix[i - 1]
+        while k and sequence[i] != sequence[k]:
+            k = prefix[k - 1]
+        if sequence[i] == sequence[k]:
+            k += 1
+        prefix[i] = k
+    return prefix[-1]
+
+
+def iter_transcript_words(lines, rolling=True):
+    """Words of the transcript; with rolling (auto-captions), each cue's overlap with the previous cue is removed"""
+    previous, previous_end = [], None
+    for start, end, text in iter_cues(lines):
+        words = text.split()
+        if not rolling:
+            yield from words
+            continue
+        skip = overlap(previous, words)
+        if skip < len(previous) and skip < MIN_PARTIAL_OVERLAP:
+            skip = 0
+        if skip == len(words) and start - previous_end > REPEAT_GAP_SECONDS:
+            skip = 0
+        yield from words[skip:]
+        previous, previous_end = words, end
+
+
+def parse_vtt_lines(lines, rolling=True):
+    """Clean transcript text from an iterable of VTT lines; rolling=False for manually written captions"""
+    # split() also breaks on Unicode line/paragraph separators, so none survive
+    return ' '.join(iter_transcript_words(lines, rolling))
+
+
+def parse_vtt_text(content, rolling=True):
+    """Parse VTT subtitle text into clean transcript text"""
+    return parse_vtt_lines(io.StringIO(content), rolling)
+
+
+def parse_vtt_subtitles(vtt_path, rolling=True):
+    """Parse VTT subtitle file into clean transcript text"""
+    with open(vtt_path, 'r', encoding='utf-8', errors='replace') as f:
+        return parse_vtt_lines(f, rolling)
@@ -0,0 +1,62 @@
+"""
+Streaming ZIP writer - builds an archive on the fly without staging files on disk
+"""
+import io
+import zipfile
+
+# Copy buffer between upstream and the zip stream
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _StreamSink(io.RawIOBase):
+    """Unseekable sink that collects whatever ZipFile writes until it's drained"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries):
+    """Yield a ZIP archive chunk by chunk.
+
+    `entries` yields (archive_name, chunks) pairs where `chunks` is an iterable
+    of bytes; each entry is written as it's consumed, so memory stays bounded
+    by one chunk regardless of archive size. Entries are stored uncompressed
+    (MP4 doesn't compress) and streamed with data descriptors + ZIP64, since
+    sizes aren't known up front.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, chunks in entries:
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory
+    data = sink.drain()
+    if data:
+        yield data